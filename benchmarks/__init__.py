@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for pyretrace. Run them from the repository root, e.g.
+
+    $ python -m benchmarks.bench_cache
+"""
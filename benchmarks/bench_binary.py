@@ -0,0 +1,45 @@
+"""
+Compares execute() on text and on bytes, for logcat input, with and without
+the prefilter.
+"""
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_logcat_lines, generate_mapping
+from pyretrace import Retrace
+
+
+def main(count=300000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+        trace_file = os.path.join(directory, 'logcat.txt')
+        with open(trace_file, 'w') as writer:
+            writer.writelines(generate_logcat_lines(count))
+
+        for prefilter in (False, True):
+            retrace = Retrace(mapping_file, stacktrace_file=trace_file, prefilter=prefilter)
+
+            for binary in (False, True):
+                with open(os.devnull, 'wb' if binary else 'w') as output:
+                    start = time.time()
+                    retrace.execute(output=output, binary=binary)
+                    seconds = time.time() - start
+
+                    # Run again to measure memory, as tracing slows everything down.
+                    tracemalloc.start()
+                    retrace.execute(output=output, binary=binary)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+
+                print('%-6s prefilter %-5s %10.0f lines/s, peak %.1f MB traced' % (
+                    'bytes' if binary else 'text', prefilter, count / seconds, peak / 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
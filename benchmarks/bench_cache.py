@@ -0,0 +1,43 @@
+"""
+Compares loading a mapping by parsing its text against loading its compiled
+copy, and deobfuscating against each.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from pyretrace import Retrace
+from pyretrace.cache import CompiledMappingReader
+
+
+def timed(function):
+    start = time.time()
+    function()
+    return time.time() - start
+
+
+def main(count=100000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes=5000)
+        print('mapping: %.1f MB' % (os.path.getsize(mapping_file) / 1e6))
+
+        print('cold parse:     %.3fs' % timed(lambda: Retrace(mapping_file)))
+        print('compile:        %.3fs' % timed(lambda: CompiledMappingReader(mapping_file).compile()))
+        print('cached load:    %.3fs' % timed(lambda: Retrace(mapping_file, use_cache=True)))
+
+        lines = [line.rstrip('\n') for line in generate_trace_lines(count, classes=5000)]
+        # The cached tables decode a class the first time it's looked up, so
+        # the first pass pays for what the parsed mapping paid loading.
+        for name, use_cache in (('parsed', False), ('cached', True)):
+            retrace = Retrace(mapping_file, use_cache=use_cache)
+            print('%-15s %.0f lines/s' % (name + ':', count / timed(lambda: retrace.deobfuscate_many(lines))))
+            print('%-15s %.0f lines/s' % (name + ', again:', count / timed(lambda: retrace.deobfuscate_many(lines))))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares deobfuscating frames given as columns with deobfuscate_frames() and
+with deobfuscate_many() on the text lines built from them.
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy
+
+from benchmarks.synthetic import generate_mapping, obfuscated_name
+from pyretrace import Retrace
+
+
+def generate_frames(count, classes=1000, methods=20, seed=0):
+    """
+    Returns arrays of obfuscated class names, method names and line numbers.
+    """
+
+    rng = random.Random(seed)
+
+    class_names = numpy.array(['a.%s' % obfuscated_name(rng.randrange(classes)) for _ in range(count)])
+    method_names = numpy.array([obfuscated_name(rng.randrange(5)) for _ in range(count)])
+    line_numbers = numpy.array([rng.randint(0, methods * 15) for _ in range(count)])
+
+    return class_names, method_names, line_numbers
+
+
+def main(count=1000000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+        class_names, method_names, line_numbers = generate_frames(count)
+        retrace = Retrace(mapping_file)
+
+        start = time.time()
+        lines = ['at %s.%s(SourceFile:%d)' % frame
+                 for frame in zip(class_names.tolist(), method_names.tolist(), line_numbers.tolist())]
+        retrace.deobfuscate_many(lines)
+        seconds = time.time() - start
+        print('%-18s %10.0f frames/s' % ('deobfuscate_many', count / seconds))
+
+        start = time.time()
+        retrace.deobfuscate_frames(class_names, method_names, line_numbers)
+        seconds = time.time() - start
+        print('%-18s %10.0f frames/s' % ('deobfuscate_frames', count / seconds))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
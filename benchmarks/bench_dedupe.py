@@ -0,0 +1,64 @@
+"""
+Compares deobfuscating crash reports line by line with deobfuscating each
+distinct stack trace once.
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, obfuscated_name
+from pyretrace import Retrace
+from pyretrace.traces import TraceDeduplicator
+
+
+def generate_reports(count, distinct, classes=1000, methods=20, seed=0):
+    """
+    Returns the lines of count crash reports, drawn from distinct stack traces.
+    """
+
+    rng = random.Random(seed)
+
+    traces = []
+    for _ in range(distinct):
+        trace = ['java.lang.IllegalStateException: a.%s not ready\n' % obfuscated_name(rng.randrange(classes))]
+        for _ in range(rng.randint(10, 40)):
+            trace.append('\tat a.%s.%s(SourceFile:%d)\n' % (
+                obfuscated_name(rng.randrange(classes)), obfuscated_name(rng.randrange(5)),
+                rng.randint(1, methods * 15)))
+        traces.append(trace)
+
+    lines = []
+    for _ in range(count):
+        lines.extend(rng.choice(traces))
+
+    return lines
+
+
+def main(count=5000, distinct=100):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+        lines = generate_reports(count, distinct)
+        retrace = Retrace(mapping_file)
+
+        start = time.time()
+        retrace.deobfuscate_many(lines)
+        print('%-12s %8.3f s' % ('per line', time.time() - start))
+
+        start = time.time()
+        list(TraceDeduplicator(retrace).expand(lines))
+        print('%-12s %8.3f s' % ('expand', time.time() - start))
+
+        start = time.time()
+        TraceDeduplicator(retrace).aggregate(lines)
+        print('%-12s %8.3f s' % ('aggregate', time.time() - start))
+
+        print('%d reports, %d lines, %d distinct traces' % (count, len(lines), distinct))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
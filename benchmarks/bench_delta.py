@@ -0,0 +1,72 @@
+"""
+Compares loading consecutive builds' mappings in full with loading each as a
+delta against the previous build, in time and in memory for all of them.
+"""
+import gc
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_mapping
+from pyretrace import Retrace
+
+
+def generate_builds(directory, builds, classes, changed, seed=0):
+    """
+    Writes the mappings of consecutive builds, each with the line numbers of
+    a fraction of the previous build's classes changed, returning their paths.
+    """
+
+    rng = random.Random(seed)
+
+    path = generate_mapping(os.path.join(directory, 'build0.txt'), classes)
+    with open(path) as reader:
+        sections = reader.read().split('\ncom.')
+
+    paths = [path]
+    for build in range(1, builds):
+        for _ in range(int(len(sections) * changed)):
+            index = rng.randrange(1, len(sections))
+            sections[index] = sections[index].replace('    1:', '    2:', 1)
+
+        path = os.path.join(directory, 'build%d.txt' % build)
+        with open(path, 'w') as writer:
+            writer.write('\ncom.'.join(sections))
+        paths.append(path)
+
+    return paths
+
+
+def load_builds(paths, delta):
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+
+    retraces = []
+    for path in paths:
+        retraces.append(Retrace(path, base=retraces[-1] if delta and retraces else None))
+
+    seconds = time.time() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return seconds, memory
+
+
+def main(builds=5, classes=5000, changed=0.02):
+    directory = tempfile.mkdtemp()
+    try:
+        paths = generate_builds(directory, builds, classes, changed)
+
+        for name, delta in (('full', False), ('delta', True)):
+            seconds, memory = load_builds(paths, delta)
+            print('%-6s %d builds: %6.2f s, %7.1f MB resident' % (name, builds, seconds, memory / 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures the latency of follow mode, from writing a line to its standard input
+to reading its deobfuscated version, before and while the mapping reloads.
+"""
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+
+
+def measure(process, lines, duration=0):
+    """
+    Returns the median and worst latency of the given lines, written one at a
+    time over and over for at least duration seconds.
+    """
+
+    latencies = []
+    end = time.time() + duration
+
+    for line in itertools.cycle(lines):
+        if len(latencies) >= len(lines) and time.time() >= end:
+            break
+
+        start = time.time()
+        process.stdin.write(line)
+        process.stdin.flush()
+        process.stdout.readline()
+        latencies.append(time.time() - start)
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[-1]
+
+
+def main(count=2000, classes=20000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes)
+        lines = generate_trace_lines(count, classes)
+
+        process = subprocess.Popen([sys.executable, '-c', 'import pyretrace; pyretrace.main()',
+                                    '-m', mapping_file, '--follow', '--poll-interval', '0.05'],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        try:
+            # Wait for the mapping to be loaded.
+            measure(process, lines[:1])
+
+            median, worst = measure(process, lines)
+            print('%-16s median %6.2f ms, worst %6.2f ms' % ('steady', median * 1e3, worst * 1e3))
+
+            # Change a class, so the next load is a delta, and keep writing lines meanwhile.
+            with open(mapping_file, 'a') as writer:
+                writer.write('com.example.Added -> a.added:\n')
+
+            median, worst = measure(process, lines, duration=5)
+            print('%-16s median %6.2f ms, worst %6.2f ms' % ('during reload', median * 1e3, worst * 1e3))
+        finally:
+            process.stdin.close()
+            process.wait()
+            print(process.stderr.read().strip())
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
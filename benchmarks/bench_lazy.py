@@ -0,0 +1,46 @@
+"""
+Compares eager and lazy mapping loading, for a trace touching a few dozen classes.
+"""
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_mapping, obfuscated_name
+from pyretrace import Retrace
+
+
+def measure(mapping_file, frames, lazy):
+    tracemalloc.start()
+    start = time.time()
+
+    retrace = Retrace(mapping_file, lazy=lazy)
+    loaded = time.time()
+
+    for frame in frames:
+        retrace.deobfuscate(frame, False)
+    done = time.time()
+
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return loaded - start, done - loaded, memory
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes=5000)
+        frames = ['\tat a.%s.a(SourceFile:%d)' % (obfuscated_name(index * 97 % 5000), index) for index in range(40)]
+
+        for lazy in (False, True):
+            load_time, trace_time, memory = measure(mapping_file, frames, lazy)
+            print('%-5s load %.3fs, trace %.3fs, %.1f MB' % (
+                'lazy' if lazy else 'eager', load_time, trace_time, memory / 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
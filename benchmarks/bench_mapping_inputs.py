@@ -0,0 +1,57 @@
+"""
+Compares loading a mapping from a plain file, compressed files, a file object,
+bytes and an mmap.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping
+from pyretrace.reader import MappingReader, MappingRecorder
+
+
+def load_time(source, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        MappingReader(source).pump(MappingRecorder())
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+        with open(mapping_file, 'rb') as reader:
+            contents = reader.read()
+
+        for suffix, module in (('.gz', gzip), ('.bz2', bz2), ('.xz', lzma)):
+            with open(mapping_file + suffix, 'wb') as writer:
+                writer.write(module.compress(contents))
+            print('%-12s %8.1f ms' % (suffix[1:], load_time(mapping_file + suffix) * 1e3))
+
+        print('%-12s %8.1f ms' % ('plain', load_time(mapping_file) * 1e3))
+        print('%-12s %8.1f ms' % ('bytes', load_time(contents) * 1e3))
+        print('%-12s %8.1f ms' % ('file object', load_time(io.BytesIO(contents), repeat=1) * 1e3))
+
+        with open(mapping_file, 'rb') as reader:
+            buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                print('%-12s %8.1f ms' % ('mmap', load_time(buffer) * 1e3))
+            finally:
+                buffer.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Reports the memory taken by a loaded mapping, per class and member mapping.
+"""
+import gc
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from benchmarks.synthetic import generate_mapping
+from pyretrace import Retrace
+
+
+def main(classes=2000, fields=5, methods=20):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes, fields, methods)
+        entries = classes * (1 + fields + methods)
+
+        gc.collect()
+        tracemalloc.start()
+        retrace = Retrace(mapping_file)
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        print('%d entries, %.1f MB, %.1f bytes/entry' % (entries, memory / 1e6, float(memory) / entries))
+        return retrace
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
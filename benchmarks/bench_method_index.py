@@ -0,0 +1,50 @@
+"""
+Times method lookups by line number in a class where thousands of methods
+share the same obfuscated name, in a MethodSet and in shared mapping tables.
+"""
+import random
+import timeit
+
+from pyretrace import MethodInfo, MethodSet
+from pyretrace.shared import SharedMappingTables, compile_tables
+
+
+def main(methods=5000, lookups=10000):
+    method_set = MethodSet()
+    for index in range(methods):
+        method_set.add(MethodInfo(index * 10 + 1, index * 10 + 9, 'void', 'int', 'method%d' % index))
+
+    tables = SharedMappingTables(compile_tables({'a': 'com.example.Big'}, {},
+                                                {'com.example.Big': {'a': method_set}}))
+    shared_method_set = tables.class_method_map.get('com.example.Big').get('a')
+
+    rng = random.Random(0)
+    line_numbers = [rng.randint(1, methods * 10) for _ in range(lookups)]
+
+    def linear():
+        for line_number in line_numbers:
+            for method_info in method_set:
+                if method_info.matches(line_number, None, None):
+                    break
+
+    def indexed():
+        for line_number in line_numbers:
+            for method_info in method_set.candidates(line_number):
+                if method_info.matches(line_number, None, None):
+                    break
+
+    def shared():
+        for line_number in line_numbers:
+            for method_info in shared_method_set.candidates(line_number):
+                if method_info.matches(line_number, None, None):
+                    break
+
+    indexed()
+
+    for name, function in (('linear', linear), ('indexed', indexed), ('shared', shared)):
+        seconds = min(timeit.repeat(function, number=1, repeat=3))
+        print('%-8s %10.1f lookups/s' % (name, lookups / seconds))
+
+
+if __name__ == '__main__':
+    main()
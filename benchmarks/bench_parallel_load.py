@@ -0,0 +1,34 @@
+"""
+Times parsing a synthetic mapping with an increasing number of processes.
+
+    $ python -m benchmarks.bench_parallel_load [classes]
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping
+from pyretrace import Retrace
+
+
+def main(classes=20000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes=classes)
+        print('mapping: %.1f MB, %d cores' % (os.path.getsize(mapping_file) / 1e6, multiprocessing.cpu_count()))
+
+        jobs = 1
+        while jobs <= max(multiprocessing.cpu_count(), 2):
+            start = time.time()
+            Retrace(mapping_file, load_jobs=jobs)
+            print('%2d jobs: %.3fs' % (jobs, time.time() - start))
+            jobs *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,35 @@
+"""
+Measures how much the prefilter saves on logcat text, where most lines
+aren't stack frames.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_logcat_lines, generate_mapping
+from pyretrace import Retrace
+
+
+def main(count=200000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+
+        # As execute() passes them, without their line breaks: lines ending in
+        # whitespace are never skipped, as matching them would strip it.
+        lines = [line.rstrip('\n') for line in generate_logcat_lines(count)]
+
+        for prefilter in (False, True):
+            retrace = Retrace(mapping_file, prefilter=prefilter)
+
+            start = time.time()
+            retrace.deobfuscate_many(lines)
+            print('prefilter %-5s %10.0f lines/s %s' % (
+                prefilter, count / (time.time() - start), retrace.prefilter_info() or ''))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares looking up the obfuscated names of original methods by scanning the
+maps of a Retrace with looking them up in its reverse index.
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping
+from pyretrace import Retrace
+
+
+def linear_lookup(retrace, class_name, method_name):
+    matches = []
+    for obfuscated_class_name, original_class_name in retrace.class_map.items():
+        if original_class_name != class_name:
+            continue
+
+        for obfuscated_method_name, method_set in retrace.class_method_map.get(class_name, {}).items():
+            if any(method_info.original_name == method_name for method_info in method_set):
+                matches.append((obfuscated_class_name, obfuscated_method_name))
+
+    return matches
+
+
+def main(count=200, classes=20000, seed=0):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes)
+        retrace = Retrace(mapping_file)
+
+        rng = random.Random(seed)
+        class_names = sorted(retrace.class_method_map)
+        queries = []
+        for _ in range(count):
+            class_name = rng.choice(class_names)
+            method_set = rng.choice(list(retrace.class_method_map[class_name].values()))
+            queries.append((class_name, next(iter(method_set)).original_name))
+
+        start = time.time()
+        expected = [linear_lookup(retrace, class_name, method_name) for class_name, method_name in queries]
+        print('%-12s %8.3f ms/lookup' % ('linear scan', (time.time() - start) * 1e3 / count))
+
+        start = time.time()
+        index = retrace.reverse_index()
+        print('%-12s %8.3f s' % ('index build', time.time() - start))
+
+        start = time.time()
+        results = [index.lookup(class_name + '.' + method_name) for class_name, method_name in queries]
+        print('%-12s %8.3f ms/lookup' % ('index', (time.time() - start) * 1e3 / count))
+
+        assert results == expected
+
+        start = time.time()
+        for _ in range(count):
+            index.classes_with_prefix('com.example.pkg1.')
+        print('%-12s %8.3f ms/lookup' % ('prefix', (time.time() - start) * 1e3 / count))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
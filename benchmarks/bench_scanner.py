@@ -0,0 +1,29 @@
+"""
+Compares the regular expression path with the class name scanner on logcat text.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_logcat_lines, generate_mapping
+from pyretrace import Retrace
+
+
+def main(count=200000):
+    directory = tempfile.mkdtemp()
+    try:
+        retrace = Retrace(generate_mapping(os.path.join(directory, 'mapping.txt')))
+        lines = generate_logcat_lines(count)
+
+        for name, deobfuscate in (('regex', lambda line: retrace.deobfuscate(line, False)),
+                                  ('scanner', retrace.deobfuscate_class_names)):
+            start = time.time()
+            changed = sum(1 for line in lines if deobfuscate(line).strip() != line.strip())
+            print('%-8s %10.0f lines/s, %d lines changed' % (name, count / (time.time() - start), changed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
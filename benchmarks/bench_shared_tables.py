@@ -0,0 +1,97 @@
+"""
+Compares the memory each forked worker takes for its own Retrace with the
+memory it takes for one attached to shared mapping tables, and their
+deobfuscation throughput. Linux only, as it reads /proc.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from pyretrace import Retrace
+from pyretrace.shared import SharedMappingTables
+
+
+def private_memory():
+    """
+    Returns the resident memory of this process that isn't shared, in bytes,
+    including the pages shared with its parent that it has written to since.
+    """
+
+    memory = 0
+    with open('/proc/self/smaps_rollup') as reader:
+        for line in reader:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                memory += int(line.split()[1]) * 1024
+
+    return memory
+
+
+def worker(mapping_file, tables_path, lines):
+    before = private_memory()
+
+    if tables_path:
+        retrace = Retrace(None, shared_tables=tables_path)
+    else:
+        retrace = Retrace(mapping_file)
+
+    growth = private_memory() - before
+
+    start = time.time()
+    retrace.deobfuscate_many(lines)
+    seconds = time.time() - start
+
+    return growth, len(lines) / seconds
+
+
+def run_workers(workers, *args):
+    """
+    Runs the worker in forked processes, one at a time, returning their results.
+    """
+
+    results = []
+    for _ in range(workers):
+        reader, writer = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            os.close(reader)
+            growth, lines_per_second = worker(*args)
+            os.write(writer, ('%d %f' % (growth, lines_per_second)).encode())
+            os._exit(0)
+
+        os.close(writer)
+        with os.fdopen(reader) as result:
+            growth, lines_per_second = result.read().split()
+        os.waitpid(pid, 0)
+
+        results.append((int(growth), float(lines_per_second)))
+
+    return results
+
+
+def main(workers=4, classes=10000, count=50000):
+    directory = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes)
+        tables_path = os.path.join(directory, 'mapping.tables')
+        lines = generate_trace_lines(count, classes)
+
+        start = time.time()
+        SharedMappingTables.create(Retrace(mapping_file), tables_path).close()
+        print('tables built in %.2f s, %.1f MB' % (time.time() - start, os.path.getsize(tables_path) / 1e6))
+
+        for name, path in (('own maps', None), ('shared tables', tables_path)):
+            results = run_workers(workers, mapping_file, path, lines)
+            growth = sum(result[0] for result in results) / len(results)
+            lines_per_second = sum(result[1] for result in results) / len(results)
+
+            print('%-14s %8.1f MB private per worker, %d workers %8.1f MB, %10.0f lines/s' % (
+                name, growth / 1e6, workers, workers * growth / 1e6, lines_per_second))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
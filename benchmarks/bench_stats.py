@@ -0,0 +1,46 @@
+"""
+Measures the overhead of stats collection on deobfuscating stack traces, by
+comparing a Retrace without stats with one collecting them.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from pyretrace import Retrace
+
+
+def best_time(retrace, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        retrace.deobfuscate_many(lines)
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+def main(count=200000, classes=2000, repeat=5):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), classes)
+        lines = [line.rstrip('\n') for line in generate_trace_lines(count, classes)]
+
+        disabled = best_time(Retrace(mapping_file), lines, repeat)
+        print('%-12s %8.3f s' % ('no stats', disabled))
+
+        retrace = Retrace(mapping_file, stats=True)
+        enabled = best_time(retrace, lines, repeat)
+        print('%-12s %8.3f s (%+.1f%%)' % ('stats', enabled, (enabled / disabled - 1) * 100))
+
+        stats = retrace.stats()
+        print('%d lines, %d method lookups, %d misses, %d ambiguous' % (
+            stats['lines'], stats['method_lookups'], stats['method_misses'], stats['ambiguous_methods']))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
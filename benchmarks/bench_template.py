@@ -0,0 +1,44 @@
+"""
+Times deobfuscate() for the default and a few custom regular expressions.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from pyretrace import STACK_TRACE_EXPRESSION, Retrace
+
+
+EXPRESSIONS = [
+    ('default', STACK_TRACE_EXPRESSION),
+    ('frames only', '.*?\\bat\\s+%c\\.%m\\s*\\(.*?(?::%l)?\\)'),
+    ('class only', '(?:.*?[:"]\\s+)?%c(?::.*)?'),
+    ('arguments', '.*?\\bat\\s+%c\\.%m\\(%a\\)'),
+]
+
+
+def main(count=200000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+        lines = generate_trace_lines(count)
+        argument_lines = [line.replace('(SourceFile:', '(int,java.lang.String) (SourceFile:') for line in lines]
+
+        for name, expression in EXPRESSIONS:
+            retrace = Retrace(mapping_file, regular_expression=expression)
+            input_lines = argument_lines if '%a' in expression else lines
+
+            start = time.time()
+            try:
+                retrace.deobfuscate_many(input_lines)
+            except Exception as ex:
+                print('%-12s failed: %r' % (name, ex))
+                continue
+            print('%-12s %10.0f lines/s' % (name, count / (time.time() - start)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares deobfuscation throughput of the per-line API and print() loop with
+the batch API and block-buffered execute().
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from pyretrace import Retrace
+
+
+def per_line_execute(retrace, path):
+    # The original execute() loop: readline() and print() for every line.
+    reader = open(path, 'r')
+    while True:
+        line = reader.readline()
+        if not line:
+            break
+        print(retrace.deobfuscate(line, False))
+    reader.close()
+
+
+def main(count=200000):
+    directory = tempfile.mkdtemp()
+    try:
+        mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'))
+        lines = generate_trace_lines(count)
+        trace_file = os.path.join(directory, 'trace.txt')
+        with open(trace_file, 'w') as writer:
+            writer.writelines(lines)
+
+        retrace = Retrace(mapping_file, stacktrace_file=trace_file)
+
+        def per_line():
+            for line in lines:
+                retrace.deobfuscate(line, False)
+
+        def many():
+            retrace.deobfuscate_many(lines)
+
+        def execute():
+            with open(os.devnull, 'w') as output:
+                retrace.execute(output=output)
+
+        def print_execute():
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                per_line_execute(retrace, trace_file)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+
+        for name, function in (('deobfuscate', per_line), ('deobfuscate_many', many),
+                               ('per-line execute', print_execute), ('execute', execute)):
+            start = time.time()
+            function()
+            print('%-18s %10.0f lines/s' % (name, count / (time.time() - start)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+The benchmark suite: times loading a synthetic mapping in every way, then
+deobfuscating synthetic stack traces and logcat output line by line, in
+batches and with execute(), and measures peak memory. Results are written
+as JSON and can be compared with a previous run's:
+
+    python -m benchmarks --output before.json
+    python -m benchmarks --output after.json --compare before.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_logcat_lines, generate_mapping, generate_trace_lines
+from pyretrace import Retrace
+from pyretrace.cache import CompiledMappingReader
+
+
+RESULTS_FORMAT_VERSION = 1
+
+# Changes smaller than this are reported as noise when comparing runs.
+NOISE_THRESHOLD = 0.05
+
+# Whether a larger value of each metric is better.
+HIGHER_IS_BETTER = {
+    'seconds': False,
+    'lines_per_second': True,
+    'peak_bytes': False,
+    'retained_bytes': False,
+}
+
+
+def best_time(function, repeat):
+    """
+    Returns the shortest time the function took over repeat calls, in seconds.
+    """
+
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+def memory_usage(function):
+    """
+    Returns the peak memory allocated while the function ran, and the memory
+    still allocated for its result, in bytes.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del result
+    return peak, retained
+
+
+class Workload():
+    """
+    The synthetic mapping, stack trace and logcat files the benchmarks run on.
+    """
+
+    def __init__(self, directory, classes, fields, methods, overloads, max_lines, unranged, lines, seed=0):
+        shape = dict(classes=classes, methods=methods, seed=seed, overloads=overloads, max_lines=max_lines)
+
+        self.mapping_file = generate_mapping(os.path.join(directory, 'mapping.txt'), fields=fields,
+                                             unranged=unranged, **shape)
+
+        self.trace_lines = [line.rstrip('\n') for line in generate_trace_lines(lines, **shape)]
+        self.trace_file = os.path.join(directory, 'trace.txt')
+        with open(self.trace_file, 'w') as writer:
+            writer.write('\n'.join(self.trace_lines) + '\n')
+
+        self.logcat_lines = [line.rstrip('\n') for line in generate_logcat_lines(lines, **shape)]
+        self.logcat_file = os.path.join(directory, 'logcat.txt')
+        with open(self.logcat_file, 'w') as writer:
+            writer.write('\n'.join(self.logcat_lines) + '\n')
+
+        self.cache_dir = os.path.join(directory, 'cache')
+        CompiledMappingReader(self.mapping_file, self.cache_dir).compile()
+
+
+def load_benchmarks(workload, repeat):
+    results = dict()
+
+    for name, options in (('load', {}),
+                          ('load_cache', {'cache_dir': workload.cache_dir}),
+                          ('load_lazy', {'lazy': True})):
+        def load():
+            return Retrace(workload.mapping_file, **options)
+
+        peak, retained = memory_usage(load)
+        results[name] = {
+            'seconds': best_time(load, repeat),
+            'peak_bytes': peak,
+            'retained_bytes': retained,
+        }
+
+    return results
+
+
+def line_benchmarks(workload, repeat):
+    results = dict()
+
+    retrace = Retrace(workload.mapping_file)
+    prefiltered = Retrace(workload.mapping_file, prefilter=True)
+
+    def per_line(lines):
+        def run():
+            for line in lines:
+                retrace.deobfuscate(line, False)
+        return run
+
+    def many(lines, retrace=retrace):
+        return lambda: retrace.deobfuscate_many(lines)
+
+    def scan(lines):
+        return lambda: [retrace.deobfuscate_class_names(line) for line in lines]
+
+    for name, lines, function in (('deobfuscate', workload.trace_lines, per_line(workload.trace_lines)),
+                                  ('deobfuscate_many', workload.trace_lines, many(workload.trace_lines)),
+                                  ('deobfuscate_many_logcat', workload.logcat_lines, many(workload.logcat_lines)),
+                                  ('deobfuscate_many_logcat_prefilter', workload.logcat_lines,
+                                   many(workload.logcat_lines, prefiltered)),
+                                  ('scan_logcat', workload.logcat_lines, scan(workload.logcat_lines))):
+        seconds = best_time(function, repeat)
+        results[name] = {'seconds': seconds, 'lines_per_second': len(lines) / seconds}
+
+    return results
+
+
+def execute_benchmarks(workload, repeat):
+    results = dict()
+
+    for name, path, lines, options, execute_options in (
+            ('execute', workload.trace_file, workload.trace_lines, {}, {}),
+            ('execute_binary', workload.trace_file, workload.trace_lines, {}, {'binary': True}),
+            ('execute_logcat', workload.logcat_file, workload.logcat_lines, {}, {}),
+            ('execute_logcat_prefilter', workload.logcat_file, workload.logcat_lines, {'prefilter': True}, {})):
+
+        # End to end, loading the mapping included.
+        def execute():
+            retrace = Retrace(workload.mapping_file, stacktrace_file=path, **options)
+            with open(os.devnull, 'wb' if execute_options.get('binary') else 'w') as output:
+                retrace.execute(output=output, **execute_options)
+
+        seconds = best_time(execute, repeat)
+        results[name] = {
+            'seconds': seconds,
+            'lines_per_second': len(lines) / seconds,
+            'peak_bytes': memory_usage(execute)[0],
+        }
+
+    return results
+
+
+BENCHMARK_GROUPS = (('load', load_benchmarks), ('lines', line_benchmarks), ('execute', execute_benchmarks))
+
+
+def commit():
+    """
+    Returns the git commit of the working tree, or None.
+    """
+
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        return output.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(parameters, groups=None, repeat=3, log=None):
+    """
+    Runs the benchmarks of the given groups, or all of them, on a workload
+    generated with the given parameters, returning the results.
+    """
+
+    directory = tempfile.mkdtemp()
+    try:
+        workload = Workload(directory, **parameters)
+
+        results = dict()
+        for name, run in BENCHMARK_GROUPS:
+            if groups and name not in groups:
+                continue
+
+            if log:
+                print('Running %s benchmarks...' % name, file=log)
+            results.update(run(workload, repeat))
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        'version': RESULTS_FORMAT_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'processors': os.cpu_count(),
+            'commit': commit(),
+        },
+        'parameters': dict(parameters, repeat=repeat),
+        'results': results,
+    }
+
+
+def format_value(metric, value):
+    if metric.endswith('bytes'):
+        return '%.1f MB' % (value / 1e6)
+    elif metric == 'seconds':
+        return '%.3f s' % value
+    else:
+        return '%.0f/s' % value
+
+
+def print_results(results, output=None):
+    output = output or sys.stdout
+
+    for name, metrics in sorted(results['results'].items()):
+        print('%-36s %s' % (name, ', '.join('%s %s' % (metric, format_value(metric, value))
+                                            for metric, value in sorted(metrics.items()))), file=output)
+
+
+def compare_results(previous, current):
+    """
+    Returns a (benchmark, metric, previous value, current value, relative
+    change, verdict) tuple for every metric of both runs, the verdict being
+    'better', 'worse' or 'same' when within NOISE_THRESHOLD.
+    """
+
+    comparison = []
+
+    for name, metrics in sorted(current['results'].items()):
+        previous_metrics = previous['results'].get(name, {})
+
+        for metric, value in sorted(metrics.items()):
+            previous_value = previous_metrics.get(metric)
+            if not previous_value:
+                continue
+
+            change = (value - previous_value) / float(previous_value)
+            if abs(change) < NOISE_THRESHOLD:
+                verdict = 'same'
+            elif (change > 0) == HIGHER_IS_BETTER.get(metric, False):
+                verdict = 'better'
+            else:
+                verdict = 'worse'
+
+            comparison.append((name, metric, previous_value, value, change, verdict))
+
+    return comparison
+
+
+def print_comparison(comparison, output=None):
+    output = output or sys.stdout
+
+    for name, metric, previous_value, value, change, verdict in comparison:
+        print('%-36s %-16s %12s -> %-12s %+7.1f%% %s' % (
+            name, metric, format_value(metric, previous_value), format_value(metric, value), change * 100, verdict),
+            file=output)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the pyretrace benchmark suite')
+    parser.add_argument("--classes", type=int, default=2000, help="number of classes in the mapping")
+    parser.add_argument("--fields", type=int, default=5, help="number of fields per class")
+    parser.add_argument("--methods", type=int, default=20, help="number of methods per class")
+    parser.add_argument("--overloads", type=int, default=4, help="number of methods sharing each obfuscated name")
+    parser.add_argument("--max-lines", type=int, dest="max_lines", default=30,
+                        help="largest number of line numbers a method covers")
+    parser.add_argument("--unranged", type=float, default=0.0, help="fraction of methods without line numbers")
+    parser.add_argument("--lines", type=int, default=100000, help="number of stack trace and logcat lines")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each benchmark, the best one counting")
+    parser.add_argument("--group", dest="groups", action="append", choices=[name for name, _ in BENCHMARK_GROUPS],
+                        help="only run this group of benchmarks. Can be given more than once")
+    parser.add_argument("--output", "-o", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", "-c", default=None, help="compare the results with this earlier JSON file")
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+
+    parameters = dict(classes=options.classes, fields=options.fields, methods=options.methods,
+                      overloads=options.overloads, max_lines=options.max_lines, unranged=options.unranged,
+                      lines=options.lines)
+
+    results = run_suite(parameters, options.groups, options.repeat, log=sys.stderr)
+
+    if options.output:
+        with open(options.output, 'w') as writer:
+            json.dump(results, writer, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as reader:
+            previous = json.load(reader)
+
+        if previous.get('parameters') != results['parameters']:
+            print('Warning: the runs were made with different parameters', file=sys.stderr)
+
+        print_comparison(compare_results(previous, results))
+    else:
+        print_results(results)
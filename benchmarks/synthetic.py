@@ -0,0 +1,129 @@
+import random
+
+
+def class_name(index, prefix='com.example'):
+    return '%s.pkg%d.Class%d' % (prefix, index % 50, index)
+
+
+def obfuscated_name(index):
+    """
+    Returns a short, ProGuard-like identifier for the given index: a, b, ..., z, aa, ab...
+    """
+
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    name = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, len(letters))
+        name = letters[remainder] + name
+    return name
+
+
+def method_name_count(methods, overloads):
+    """
+    Returns the number of distinct obfuscated method names of a class with the
+    given number of methods, each name shared by about overloads methods.
+    """
+
+    return max(1, -(-methods // max(1, overloads)))
+
+
+def last_line_number(methods, max_lines):
+    """
+    Returns about the last line number covered by a class's methods.
+    """
+
+    return methods * (max_lines // 2)
+
+
+def generate_mapping(path, classes=1000, fields=5, methods=20, seed=0, overloads=4, max_lines=30, unranged=0.0):
+    """
+    Writes a synthetic ProGuard mapping file and returns its path.
+
+    Each class has the given number of fields and methods. About overloads
+    methods share each obfuscated method name, and each method covers 1 to
+    max_lines line numbers, except for the given fraction of methods, which
+    have no line numbers at all.
+    """
+
+    rng = random.Random(seed)
+    method_names = method_name_count(methods, overloads)
+
+    with open(path, 'w') as writer:
+        for class_index in range(classes):
+            writer.write('%s -> a.%s:\n' % (class_name(class_index), obfuscated_name(class_index)))
+
+            for field_index in range(fields):
+                writer.write('    java.lang.String field%d -> %s\n' % (field_index, obfuscated_name(field_index)))
+
+            line_number = 1
+            for method_index in range(methods):
+                if unranged and rng.random() < unranged:
+                    writer.write('    void method%d(int,java.lang.String) -> %s\n' % (
+                        method_index, obfuscated_name(method_index % method_names)))
+                    continue
+
+                length = rng.randint(1, max_lines)
+                writer.write('    %d:%d:void method%d(int,java.lang.String) -> %s\n' % (
+                    line_number, line_number + length, method_index, obfuscated_name(method_index % method_names)))
+                line_number += length + 1
+
+    return path
+
+
+def generate_trace_lines(count, classes=1000, methods=20, seed=0, overloads=4, max_lines=30):
+    """
+    Returns obfuscated stack trace lines for a mapping from generate_mapping(),
+    mixed with unrelated log lines.
+    """
+
+    rng = random.Random(seed)
+    method_names = method_name_count(methods, overloads)
+    line_numbers = last_line_number(methods, max_lines)
+    lines = []
+
+    for index in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            lines.append('\tat a.%s.%s(SourceFile:%d)\n' % (
+                obfuscated_name(rng.randrange(classes)), obfuscated_name(rng.randrange(method_names)), rng.randint(1, line_numbers)))
+        elif kind < 0.7:
+            lines.append('Caused by: a.%s: something went wrong\n' % obfuscated_name(rng.randrange(classes)))
+        else:
+            lines.append('I/ActivityManager( %d): Start proc com.example for activity %d\n' % (
+                rng.randint(100, 9999), index))
+
+    return lines
+
+
+def generate_logcat_lines(count, classes=1000, methods=20, seed=0, overloads=4, max_lines=30):
+    """
+    Returns logcat-like lines for a mapping from generate_mapping(): mostly
+    unrelated messages, some mentioning obfuscated class names, and a few
+    stack traces.
+    """
+
+    rng = random.Random(seed)
+    method_names = method_name_count(methods, overloads)
+    line_numbers = last_line_number(methods, max_lines)
+    lines = []
+
+    while len(lines) < count:
+        prefix = '10-17 12:%02d:%02d.%03d %5d %5d ' % (
+            rng.randrange(60), rng.randrange(60), rng.randrange(1000), rng.randint(100, 9999), rng.randint(100, 9999))
+        kind = rng.random()
+
+        if kind < 0.02:
+            lines.append(prefix + 'E AndroidRuntime: java.lang.IllegalStateException: a.%s not ready\n' %
+                         obfuscated_name(rng.randrange(classes)))
+            for _ in range(rng.randint(5, 20)):
+                lines.append(prefix + 'E AndroidRuntime: \tat a.%s.%s(SourceFile:%d)\n' % (
+                    obfuscated_name(rng.randrange(classes)), obfuscated_name(rng.randrange(method_names)),
+                    rng.randint(1, line_numbers)))
+        elif kind < 0.1:
+            lines.append(prefix + 'D Analytics: {"event": "crash", "component": "a.%s", "count": %d}\n' % (
+                obfuscated_name(rng.randrange(classes)), rng.randrange(100)))
+        else:
+            lines.append(prefix + 'I ActivityManager: Displayed com.example/.MainActivity: +%dms\n' % rng.randrange(900))
+
+    return lines[:count]
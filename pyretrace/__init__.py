@@ -1,10 +1,23 @@
 from __future__ import print_function
 
 import argparse
+import itertools
+import json
+import os
 import re
+import stat
 import sys
+from bisect import bisect_right
+from sys import intern
 
-from pyretrace.reader import MappingReader
+from pyretrace.cache import CompiledMappingReader
+from pyretrace.delta import DeltaMappingReader
+from pyretrace.lru import LRUCache
+from pyretrace.parallel import ParallelMappingReader, deobfuscate_parallel
+from pyretrace.reader import LazyMappingReader, MappingError, MappingReader
+from pyretrace.scanner import ClassNameScanner, LinePrefilter
+from pyretrace.stats import RetraceStats, instrument, timed
+from pyretrace.traces import TraceDeduplicator
 
 
 STACK_TRACE_EXPRESSION = "(?:.*?\\bat\\s+%c\\.%m\\s*\\(.*?(?::%l)?\\)\\s*)|(?:(?:.*?[:\"]\\s+)?%c(?::.*)?)"
@@ -16,17 +29,112 @@ REGEX_TYPE = REGEX_CLASS + "(?:\\[\\])*"
 REGEX_MEMBER = "<?\\b[A-Za-z0-9_$]+\\b>?"
 REGEX_ARGUMENTS = "(?:" + REGEX_TYPE + "(?:\\s*,\\s*" + REGEX_TYPE + ")*)?"
 
+# Approximate number of characters read from the stack trace at a time.
+READ_BLOCK_SIZE = 1 << 16
+# Number of output lines written at a time, when deobfuscating in parallel.
+WRITE_BLOCK_LINES = 1024
+# Number of distinct deobfuscated stack traces remembered, when deduplicating
+# them as they're written.
+DEDUPE_TRACES = 10000
 
-class Retrace():
-    def __init__(self, mapping_file, verbose=False, regular_expression=STACK_TRACE_EXPRESSION, stacktrace_file=None):
+# Bytes lines are decoded with this encoding, only where something is translated.
+# Invalid bytes are kept as they are.
+BYTES_ENCODING = 'utf-8'
+BYTES_ERRORS = 'surrogateescape'
+
+
+class MappingMaps():
+    """
+    A MappingProcessor that builds the maps of a Retrace: obfuscated class
+    name -> original class name, and original class name -> obfuscated field
+    and method names -> fields and methods.
+    """
+
+    def __init__(self):
+        self.class_map = dict()
+        self.class_field_map = dict()
+        self.class_method_map = dict()
+
+    def process_class_mapping(self, class_name, new_class_name):
+        # Obfuscated class name -> original class name.
+        self.class_map[intern(new_class_name)] = intern(class_name)
+
+        return True
+
+    def process_field_mapping(self, class_name, field_type, field_name, new_field_name):
+        # Original class name -> obfuscated field names.
+        field_map = self.class_field_map.get(class_name)
+        if not field_map:
+            field_map = dict()
+            self.class_field_map[intern(class_name)] = field_map
+
+        # Obfuscated field name -> fields.
+        field_set = field_map.get(new_field_name)
+        if not field_set:
+            field_set = []
+            field_map[intern(new_field_name)] = field_set
+
+        # Add the field information. Types and names repeat a lot across a
+        # mapping, so only keep one copy of each.
+        field_set.append(FieldInfo(intern(field_type), intern(field_name)))
+
+    def process_method_mapping(self,
+                               class_name,
+                               first_line_number,
+                               last_line_number,
+                               method_return_type,
+                               method_name,
+                               method_arguments,
+                               new_method_name):
+
+        # Original class name -> obfuscated method names.
+        method_map = self.class_method_map.get(class_name)
+        if not method_map:
+            method_map = dict()
+            self.class_method_map[intern(class_name)] = method_map
+
+        # Obfuscated method name -> methods.
+        method_set = method_map.get(new_method_name)
+        if not method_set:
+            method_set = MethodSet()
+            method_map[intern(new_method_name)] = method_set
+
+        # Add the method information.
+        method_set.add(MethodInfo(first_line_number,
+                                  last_line_number,
+                                  intern(method_return_type),
+                                  intern(method_arguments),
+                                  intern(method_name)))
+
+
+class Retrace(MappingMaps):
+    def __init__(self, mapping_file, verbose=False, regular_expression=STACK_TRACE_EXPRESSION, stacktrace_file=None,
+                 use_cache=False, cache_dir=None, lazy=False, cache_size=0,
+                 load_jobs=1, prefilter=False, shared_tables=None, base=None, stats=False, stats_hook=None):
         self.regular_expression = regular_expression
         self.verbose = verbose
         self.mapping_file = mapping_file
         self.stacktrace_file = stacktrace_file
+        self.use_cache = use_cache or cache_dir is not None
+        self.cache_dir = cache_dir
+        self.lazy_reader = None
+        self.shared_tables = None
 
-        self.class_map = dict()
-        self.class_field_map = dict()
-        self.class_method_map = dict()
+        # Class name -> digest of its section in the mapping file, when diffed
+        # against another build's.
+        self.section_digests = None
+
+        # Input line -> output line, for frames that keep showing up.
+        self.line_cache = LRUCache(max_entries=cache_size) if cache_size > 0 else None
+        self.class_name_scanner = None
+        self.reverse = None
+
+        # Counters and stage timings, and a function given a snapshot of them
+        # once the mapping is loaded and whenever execute() is done.
+        self.stats_collector = RetraceStats() if stats or stats_hook is not None else None
+        self.stats_hook = stats_hook
+
+        MappingMaps.__init__(self)
 
         self.options = {
             'c': REGEX_CLASS,
@@ -38,9 +146,48 @@ class Retrace():
             'a': REGEX_ARGUMENTS
         }
 
-        # Read the mapping file.
-        mapping_reader = MappingReader(self.mapping_file)
-        mapping_reader.pump(self)
+        # Read the mapping file. A lazy reader only reads the class mappings
+        # now, and the members of each class on demand. Shared tables are
+        # looked up in place instead, and not read at all, like an up to date
+        # compiled copy of the mapping file. Given the Retrace of a previous
+        # build as a base, only the classes that changed since are read.
+        compiled_reader = None
+        if shared_tables is None and self.use_cache and not lazy and base is None:
+            compiled_reader = CompiledMappingReader(self.mapping_file, self.cache_dir, load_jobs)
+            compiled_reader.stats = self.stats_collector
+            with timed(self.stats_collector, 'load'):
+                shared_tables = compiled_reader.load()
+
+        if shared_tables is not None:
+            if not hasattr(shared_tables, 'class_map'):
+                from pyretrace.shared import SharedMappingTables
+                shared_tables = SharedMappingTables.open(shared_tables)
+
+            self.shared_tables = shared_tables
+            if compiled_reader is not None:
+                # Tables only this process looks up keep what they've decoded.
+                self.class_map, self.class_field_map, self.class_method_map = shared_tables.memoized_maps()
+            else:
+                self.class_map = shared_tables.class_map
+                self.class_field_map = shared_tables.class_field_map
+                self.class_method_map = shared_tables.class_method_map
+        else:
+            if lazy:
+                self.lazy_reader = LazyMappingReader(self.mapping_file)
+                mapping_reader = self.lazy_reader
+            elif base is not None:
+                mapping_reader = DeltaMappingReader(self.mapping_file, base)
+            elif compiled_reader is not None:
+                # Writes the compiled copy once parsed.
+                mapping_reader = compiled_reader
+            elif load_jobs > 1:
+                mapping_reader = ParallelMappingReader(self.mapping_file, load_jobs)
+            else:
+                mapping_reader = MappingReader(self.mapping_file)
+
+            mapping_reader.stats = self.stats_collector
+            with timed(self.stats_collector, 'load'):
+                mapping_reader.pump(self)
 
         expression_buffer = ''
         self.expression_types = list(range(32))
@@ -70,134 +217,337 @@ class Retrace():
         expression_buffer += self.regular_expression[index: len(self.regular_expression)]
 
         self.pattern = re.compile(expression_buffer)
-
-    def execute(self):
+        self.bytes_pattern = re.compile(expression_buffer.encode(BYTES_ENCODING))
+
+        # Compile the expression types into a handler per group, in order.
+        self.template = [self.group_handler(expression_type)
+                         for expression_type in self.expression_types[:self.expression_type_count]]
+
+        # Apart from stripping matched lines and respacing argument lists,
+        # everything the regular expression could translate hinges on class
+        # names, so other lines without any known one can skip it altogether.
+        self.prefilter = None
+        if prefilter:
+            expression_types = self.expression_types[:self.expression_type_count]
+            self.prefilter = LinePrefilter(self.class_map, 'C' in expression_types, 'a' in expression_types)
+
+        # Disabled stats cost nothing, as only an instrumented Retrace counts.
+        if self.stats_collector is not None:
+            instrument(self, self.stats_collector)
+            self.report_stats()
+
+    def execute(self, jobs=1, output=None, block_size=READ_BLOCK_SIZE, flush_lines=0, scan=False, binary=False,
+                dedupe=None, dedupe_traces=DEDUPE_TRACES):
         """
-        Will start looping over stacktrace_file or sys.stdin, deobfuscating line by line
+        Will start looping over stacktrace_file or sys.stdin, deobfuscating it block by block
+        and writing the result to output (sys.stdout by default).
+        With more than one job, lines are deobfuscated by a pool of processes, and
+        written in their original order.
+        Output is flushed every flush_lines lines, or only at the end if 0. Input
+        from a pipe or terminal is read as soon as it's available, and its output
+        flushed as soon as it's deobfuscated, whatever flush_lines is.
+        When scanning, all class names in each line are deobfuscated, instead of the
+        ones matching the regular expression.
+        In binary mode, the input is read and written as bytes, and only the parts
+        of lines that are translated get decoded.
+        With dedupe, the input is split into whole stack traces, each distinct one
+        deobfuscated once, in a single process. 'expand' writes every trace as usual,
+        remembering up to dedupe_traces distinct deobfuscated traces, or all of them
+        if 0, while 'aggregate' writes a JSON object with the fingerprint, number of
+        occurrences and deobfuscated trace of each distinct trace, once the input ends.
         """
 
         # Open the stack trace file.
         if self.stacktrace_file:
-            reader = open(self.stacktrace_file, 'r')
+            reader = open(self.stacktrace_file, 'rb' if binary else 'r')
         else:
-            reader = sys.stdin
+            reader = sys.stdin.buffer if binary else sys.stdin
 
-        while True:
-            line = reader.readline()
-            if not line:
-                break
+        # Only regular files are read a whole block at a time. Anything else,
+        # such as a pipe, is read as it's written.
+        streaming = not is_regular_file(reader)
 
-            print(self.deobfuscate(line, False))
+        if binary:
+            writer = output or sys.stdout.buffer
+            blocks = read_binary_blocks(reader, block_size)
+            line_break = b'\n'
+        else:
+            writer = output or sys.stdout
+            line_break = '\n'
+
+            if streaming and hasattr(reader, 'buffer'):
+                blocks = read_text_blocks(reader.buffer, reader.encoding, reader.errors, block_size)
+            else:
+                blocks = iter(lambda: reader.readlines(block_size), [])
+
+                # Each output line gets its own line break, so don't keep the input's,
+                # which lines passed through as they are would otherwise end with too.
+                blocks = ([line.rstrip('\n') for line in block] for block in blocks)
+
+        if dedupe == 'aggregate':
+            deduplicator = TraceDeduplicator(self, scan=scan)
+            aggregates = deduplicator.aggregate(itertools.chain.from_iterable(blocks))
+
+            output_block = [json.dumps({'fingerprint': fingerprint, 'count': count,
+                                        'trace': '\n'.join(decode(line) for line in trace)})
+                            for fingerprint, count, trace in aggregates]
+            if binary:
+                output_block = [line.encode(BYTES_ENCODING) for line in output_block]
+            output_blocks = iter([output_block])
+        elif dedupe:
+            deduplicator = TraceDeduplicator(self, dedupe_traces or None, scan=scan)
+            outputs = deduplicator.expand(itertools.chain.from_iterable(blocks))
+            output_blocks = iter(lambda: list(itertools.islice(outputs, WRITE_BLOCK_LINES)), [])
+        elif jobs > 1:
+            outputs = deobfuscate_parallel(self, itertools.chain.from_iterable(blocks), jobs, scan=scan)
+            output_blocks = iter(lambda: list(itertools.islice(outputs, WRITE_BLOCK_LINES)), [])
+        elif scan:
+            output_blocks = ([self.deobfuscate_class_names(line) for line in block] for block in blocks)
+        else:
+            output_blocks = (self.deobfuscate_many(block) for block in blocks)
+
+        with timed(self.stats_collector, 'execute'):
+            unflushed_lines = 0
+            for output_block in output_blocks:
+                output_block.append(line_break[:0])
+                writer.write(line_break.join(output_block))
+
+                unflushed_lines += len(output_block) - 1
+                if streaming or (flush_lines and unflushed_lines >= flush_lines):
+                    writer.flush()
+                    unflushed_lines = 0
+
+            writer.flush()
+
+        self.report_stats()
+
+    def deobfuscate_iter(self, lines, simple_name=False):
+        """
+        Yields a deobfuscated version of each of the given lines.
+        """
+
+        deobfuscate = self.deobfuscate
+        for line in lines:
+            yield deobfuscate(line, simple_name)
+
+    def deobfuscate_many(self, lines, simple_name=False):
+        """Return a list with a deobfuscated version of each of the given lines
+        :rtype: list
+        """
+
+        deobfuscate = self.deobfuscate
+        return [deobfuscate(line, simple_name) for line in lines]
+
+    def deobfuscate_frames(self, class_names, method_names, line_numbers, simple_name=False):
+        """Return numpy arrays of the original class and method names of stack frames given as
+        arrays of obfuscated class names, method names and line numbers (0 if unknown). Requires numpy
+        :rtype: tuple
+        """
+
+        from pyretrace.columnar import deobfuscate_frames
+        return deobfuscate_frames(self, class_names, method_names, line_numbers, simple_name)
+
+    def reverse_index(self):
+        """Return the index of obfuscated names by original name, building it on first use
+        :rtype: ReverseIndex
+        """
+
+        if self.reverse is None:
+            from pyretrace.reverse import ReverseIndex
+            self.reverse = ReverseIndex(self)
+
+        return self.reverse
 
     def deobfuscate_class(self, line):
         return self.original_class_name(line, False)
 
+    def deobfuscate_class_names(self, line, simple_name=False):
+        """Return the line with every known obfuscated class name in it deobfuscated,
+        wherever it is in the line
+        :rtype: str
+        """
+
+        if self.class_name_scanner is None:
+            self.class_name_scanner = ClassNameScanner(self.class_map)
+
+        return self.class_name_scanner.replace(line, simple_name)
+
     def deobfuscate(self, line, simple_name):
-        """Return a deobfuscated version of the given line
+        """Return a deobfuscated version of the given line, as bytes if the line is bytes
         :rtype: str
         """
 
+        # Lines that can't contain anything to deobfuscate are returned as is.
+        if self.prefilter is not None and not self.prefilter.accepts(line):
+            return line
+
+        if self.line_cache is None:
+            return self.deobfuscate_line(line, simple_name)
+
+        key = (line, simple_name)
+        output = self.line_cache.get(key)
+        if output is None:
+            output = self.deobfuscate_line(line, simple_name)
+            self.line_cache.put(key, output)
+
+        return output
+
+    def cache_info(self):
+        """
+        Returns the hit/miss counters of the line cache, or None if it's disabled.
+        """
+
+        return self.line_cache.stats() if self.line_cache is not None else None
+
+    def prefilter_info(self):
+        """
+        Returns the number of lines checked and skipped by the prefilter, or None if it's disabled.
+        """
+
+        return self.prefilter.stats() if self.prefilter is not None else None
+
+    def stats(self):
+        """
+        Returns the counters and stage timings of this Retrace, or None if stats are disabled.
+        """
+
+        return self.stats_collector.snapshot() if self.stats_collector is not None else None
+
+    def report_stats(self):
+        """
+        Passes a snapshot of the stats to the stats hook, if any.
+        """
+
+        if self.stats_hook is not None:
+            self.stats_hook(self.stats())
+
+    def deobfuscate_line(self, line, simple_name):
+        binary = isinstance(line, bytes)
+
         # Try to match it against the regular expression.
-        matcher = self.pattern.match(line)
-
-        if matcher:
-            line_number = 0
-            type = None
-            arguments = None
-
-            for expression_type_index in range(0, self.expression_type_count):
-                start_index = matcher.start(expression_type_index + 1)
-                if start_index >= 0:
-                    # match = line.split(' ')[expression_type_index]
-                    match = matcher.group(expression_type_index + 1)
-
-                    expression_type = self.expression_types[expression_type_index]
-
-                    if expression_type == 'c':
-                        class_name = self.original_class_name(match, simple_name)
-                    elif expression_type == 'C':
-                        class_name = self.original_class_name(external_class_name(match), simple_name)
-                    elif expression_type == 'l':
-                        line_number = int(match)
-                    elif expression_type == 't':
-                        type = self.original_type(match)
-                    elif expression_type == 'a':
-                        arguments = self.original_arguments(match)
-
-
-            # Deconstruct the input line and reconstruct the output
-            # line. Also collect any additional output lines for this
-            # line.
-
-            line_index = 0
-            out_line = ''
-            extra_outlines = []
-
-            for expression_type_index in range(0, self.expression_type_count):
-                start_index = matcher.start(expression_type_index + 1)
-                if start_index >= 0:
-                    end_index = matcher.end(expression_type_index + 1)
-                    match = matcher.group(expression_type_index + 1)
-
-                    # Copy a literal piece of the input line.
-                    out_line += line[line_index: start_index]
-                    # Copy a matched and translated piece of the input line.
-                    expression_type = self.expression_types[expression_type_index]
-
-                    if expression_type == 'c':
-                        class_name = self.original_class_name(match, simple_name)
-                        out_line += class_name
-                    elif expression_type == 'C':
-                        class_name = self.original_class_name(external_class_name(match), simple_name)
-                        out_line += external_class_name(match)
-                    elif expression_type == 'l':
-                        line_number = int(match)
-                        out_line += match
-                    elif expression_type == 't':
-                        type = self.original_type(match)
-                        out_line += type
-                    elif expression_type == 'f':
-                        out_line += self.original_field_name(class_name,
-                                                             match,
-                                                             type,
-                                                             out_line,
-                                                             extra_outlines)
-                    elif expression_type == 'm':
-                        out_line += self.original_method_name(class_name,
-                                                              match,
-                                                              line_number,
-                                                              type,
-                                                              arguments,
-                                                              out_line,
-                                                              extra_outlines)
-                    elif expression_type == 'a':
-                        arguments = self.original_arguments(match)
-                        out_line += arguments
-
-                    # Skip the original element whose processed version
-                    # has just been appended.
-                    line_index = end_index
-
-            # Copy the last literal piece of the input line.
-            out_line += line[line_index: len(line)]
-
-            # Print out the processed line.
-            output = out_line.strip()
-
-            for extra_line_index in range(0, len(extra_outlines)):
-                output += extra_line_index
-
-            return output
-        else:
+        matcher = (self.bytes_pattern if binary else self.pattern).match(line)
+
+        if not matcher:
             # The line didn't match the regular expression.
             # Print out the original line.
             return line
 
+        # Translate every matched group once, keeping the last class name,
+        # line number, type and arguments, for the fields and methods.
+        context = [None, 0, None, None]
+        groups = []
+
+        for (slot, translate), (start_index, end_index) in zip(self.template, matcher.regs[1:]):
+            if start_index >= 0:
+                match = line[start_index: end_index]
+                if binary:
+                    match = match.decode(BYTES_ENCODING, BYTES_ERRORS)
+
+                if slot < FIELD_SLOT:
+                    value, translation = translate(match, simple_name)
+                    context[slot] = value
+                    groups.append((start_index, end_index, slot, value, translation))
+                else:
+                    groups.append((start_index, end_index, slot, match, None))
+
+        # Deconstruct the input line and reconstruct the output
+        # line. Also collect any additional output lines for this
+        # line. Fields and methods are looked up with the class name,
+        # line number, type and arguments preceding them, if any.
+
+        line_index = 0
+        out_pieces = []
+        extra_outlines = []
+        empty = line[:0]
+
+        for start_index, end_index, slot, value, translation in groups:
+            # Copy a literal piece of the input line.
+            out_pieces.append(line[line_index: start_index])
+
+            # Copy a matched and translated piece of the input line.
+            if slot == FIELD_SLOT:
+                translation = self.original_field_name(context[CLASS_SLOT],
+                                                       value,
+                                                       context[TYPE_SLOT],
+                                                       decode(empty.join(out_pieces)),
+                                                       extra_outlines)
+            elif slot == METHOD_SLOT:
+                translation = self.original_method_name(context[CLASS_SLOT],
+                                                        value,
+                                                        context[LINE_NUMBER_SLOT],
+                                                        context[TYPE_SLOT],
+                                                        context[ARGUMENTS_SLOT],
+                                                        decode(empty.join(out_pieces)),
+                                                        extra_outlines)
+            else:
+                context[slot] = value
+
+            out_pieces.append(translation.encode(BYTES_ENCODING, BYTES_ERRORS) if binary else translation)
+
+            # Skip the original element whose processed version
+            # has just been appended.
+            line_index = end_index
+
+        # Copy the last literal piece of the input line.
+        out_pieces.append(line[line_index:])
+
+        # Print out the processed line, and any alternatives.
+        output = empty.join(out_pieces).strip()
+
+        if extra_outlines:
+            output = decode(output) + '\n' + '\n'.join(extra_outlines)
+            if binary:
+                output = output.encode(BYTES_ENCODING, BYTES_ERRORS)
+
+        return output
+
+    def group_handler(self, expression_type):
+        """
+        Returns the context slot a group of the given expression type sets, and
+        a function translating its matches into a (value, translation) pair.
+        Fields and methods are translated separately, as they depend on the
+        other groups.
+        """
+
+        if expression_type == 'c':
+            return CLASS_SLOT, self.translate_class_name
+        elif expression_type == 'C':
+            return CLASS_SLOT, self.translate_internal_class_name
+        elif expression_type == 'l':
+            return LINE_NUMBER_SLOT, translate_line_number
+        elif expression_type == 't':
+            return TYPE_SLOT, self.translate_type
+        elif expression_type == 'a':
+            return ARGUMENTS_SLOT, self.translate_arguments
+        elif expression_type == 'f':
+            return FIELD_SLOT, None
+        else:
+            return METHOD_SLOT, None
+
+    def translate_class_name(self, match, simple_name):
+        class_name = self.original_class_name(match, simple_name)
+        return class_name, class_name
+
+    def translate_internal_class_name(self, match, simple_name):
+        class_name = self.original_class_name(external_class_name(match), simple_name)
+        return class_name, internal_class_name(class_name)
+
+    def translate_type(self, match, simple_name):
+        type = self.original_type(match)
+        return type, type
+
+    def translate_arguments(self, match, simple_name):
+        arguments = self.original_arguments(match)
+        return arguments, arguments
+
     def original_field_name(self, class_name, obfuscated_field_name, type, out_line, extra_outlines):
         """Finds the original field name(s), appending the first one to the out
         line, and any additional alternatives to the extra lines.
         """
         extra_indent = -1
+        original_field_name = ''
+
+        self.load_class_members(class_name)
 
         # class name -> obfuscated field names
         field_map = self.class_field_map.get(class_name)
@@ -214,40 +564,40 @@ class Retrace():
 
                             # Append the first original name.
                             if self.verbose:
-                                out_line += field_info.type + ' '
-                            out_line += field_info.original_name
+                                original_field_name += field_info.type + ' '
+                            original_field_name += field_info.original_name
                         else:
-                            extra_buffer = ''
-                            for counter in range(0, extra_indent):
-                                # Create an additional line with the proper indentation
-                                extra_buffer += ' '
+                            # Create an additional line with the proper indentation
+                            extra_buffer = ' ' * extra_indent
 
-                                # Append the alternative name
-                                if self.verbose:
-                                    extra_buffer += field_info.type + ' '
-                                extra_buffer += field_info.original_name
+                            # Append the alternative name
+                            if self.verbose:
+                                extra_buffer += field_info.type + ' '
+                            extra_buffer += field_info.original_name
 
-                                # Store the additional line.
-                                extra_outlines.append(extra_buffer)
+                            # Store the additional line.
+                            extra_outlines.append(extra_buffer)
 
         # Just append the obfuscated name if we haven't found any matching fields.
         if extra_indent < 0:
-            return obfuscated_field_name
-        else:
-            return ''
+            original_field_name += obfuscated_field_name
+
+        return original_field_name
 
     def original_method_name(self, class_name, obfuscated_method_name, line_number, type, arguments, out_line, extra_outlines):
         extra_indent = -1
         original_method_name = ''
 
+        self.load_class_members(class_name)
+
         # Class name -> obfuscated method names.
         method_map = self.class_method_map.get(class_name)
         if method_map:
             # Obfuscated method names -> methods.
             method_set = method_map.get(obfuscated_method_name)
             if method_set:
-                # Find all matching methods.
-                for method_info in method_set:
+                # Find all matching methods, among the ones covering the line number.
+                for method_info in method_set.candidates(line_number):
                     if method_info.matches(line_number, type, arguments):
                         # Is this the first matching method?
                         if extra_indent < 0:
@@ -259,22 +609,21 @@ class Retrace():
                             original_method_name += method_info.original_name
 
                             if self.verbose:
-                                original_method_name = '%s(%s)' % (out_line, method_info.arguments)
+                                original_method_name += '(%s)' % method_info.arguments
                         else:
-                            extra_buffer = ''
-                            for counter in range(0, extra_indent):
-                                extra_buffer += ' '
+                            # Create an additional line with the proper indentation
+                            extra_buffer = ' ' * extra_indent
 
-                                # Append the alternative name.
-                                if self.verbose:
-                                    extra_buffer += method_info.type + ' '
-                                extra_buffer += method_info.original_name
+                            # Append the alternative name.
+                            if self.verbose:
+                                extra_buffer += method_info.type + ' '
+                            extra_buffer += method_info.original_name
 
-                                if self.verbose:
-                                    extra_buffer += '%s(%s)' % (extra_buffer, method_info.arguments)
+                            if self.verbose:
+                                extra_buffer += '(%s)' % method_info.arguments
 
-                                    # Store the additional line.
-                                    extra_outlines.append(extra_buffer)
+                            # Store the additional line.
+                            extra_outlines.append(extra_buffer)
 
         # Just append the obfuscated name if we haven't found any matching methods.
         if extra_indent < 0:
@@ -287,27 +636,15 @@ class Retrace():
         Returns the original argument types.
         """
 
-        original_arguments = ''
-
-        start_index = 0
-        while True:
-            end_index = obfuscated_arguments.index(',', start_index)
-            if end_index < 0:
-                break
-
-            original_arguments += self.original_type(obfuscated_arguments[start_index, end_index]) + ','
-            start_index = end_index + 1
-
-        original_arguments += self.original_type(obfuscated_arguments[start_index])
-        return original_arguments
+        return ','.join([self.original_type(argument.strip()) for argument in obfuscated_arguments.split(',')])
 
     def original_type(self, obfuscated_type):
         index = obfuscated_type.find('[')
 
         if index >= 0:
-            return self.original_class_name(obfuscated_type[0, index]) + obfuscated_type[index, len(obfuscated_type)]
+            return self.original_class_name(obfuscated_type[0: index], False) + obfuscated_type[index:]
         else:
-            return self.original_class_name(obfuscated_type)
+            return self.original_class_name(obfuscated_type, False)
 
     def original_class_name(self, obfuscated_class_name, simple_name):
         """
@@ -323,77 +660,39 @@ class Retrace():
         else:
             return obfuscated_class_name
 
-    def process_class_mapping(self, class_name, new_class_name):
+    def load_class_members(self, class_name):
         """
-        Implementations for MappingProcessor.
+        Makes sure the field and method mappings of the given original class
+        are loaded, when reading the mapping file lazily.
         """
 
-        # Obfuscated class name -> original class name.
-        self.class_map[new_class_name] = class_name
-
-        return True
-
-    def process_field_mapping(self, class_name, field_type, field_name, new_field_name):
-        # Original class name -> obfuscated field names.
-        field_map = self.class_field_map.get(class_name)
-        if not field_map:
-            field_map = dict()
-            self.class_field_map[class_name] = field_map
-
-        # Obfuscated field name -> fields.
-        field_set = field_map.get(new_field_name)
-        if not field_set:
-            field_set = set()
-            field_map[new_field_name] = field_set
-
-        # Add the field information.
-        field_set.add(FieldInfo(field_type, field_name))
-
-    def process_method_mapping(self,
-                               class_name,
-                               first_line_number,
-                               last_line_number,
-                               method_return_type,
-                               method_name,
-                               method_arguments,
-                               new_method_name):
-
-        # Original class name -> obfuscated method names.
-        method_map = self.class_method_map.get(class_name)
-        if not method_map:
-            method_map = dict()
-            self.class_method_map[class_name] = method_map
-
-        # Obfuscated method name -> methods.
-        method_set = method_map.get(new_method_name)
-        if not method_set:
-            method_set = set()
-            method_map[new_method_name] = method_set
-
-        # Add the method information.
-        method_set.add(MethodInfo(first_line_number,
-                                  last_line_number,
-                                  method_return_type,
-                                  method_arguments,
-                                  method_name))
+        if self.lazy_reader is not None:
+            self.lazy_reader.load_class(class_name, self)
 
 
 class FieldInfo():
     """
     a field record
     """
+    __slots__ = ('type', 'original_name')
+
     def __init__(self, type, original_name):
         self.type = type
         self.original_name = original_name
 
+    def __reduce__(self):
+        # Much smaller and faster to pickle than the state of the slots.
+        return FieldInfo, (self.type, self.original_name)
+
     def matches(self, type):
-        return type is None or type is self.type
+        return type is None or type == self.type
 
 
 class MethodInfo():
     """
     A Method record
     """
+    __slots__ = ('first_line_number', 'last_line_number', 'type', 'arguments', 'original_name')
 
     def __init__(self, first_line_number, last_line_number, type, arguments, original_name):
         self.first_line_number = first_line_number
@@ -402,6 +701,10 @@ class MethodInfo():
         self.arguments = arguments
         self.original_name = original_name
 
+    def __reduce__(self):
+        return MethodInfo, (self.first_line_number, self.last_line_number, self.type, self.arguments,
+                            self.original_name)
+
     def matches(self, line_number, type, arguments):
         return (line_number == 0 or (
             self.first_line_number <= line_number and line_number <= self.last_line_number) or self.last_line_number == 0) and \
@@ -409,9 +712,111 @@ class MethodInfo():
                (arguments is None or arguments == self.arguments)
 
 
+# Method sets up to this size are simply scanned, without a line number index.
+METHOD_INDEX_THRESHOLD = 8
+
+
+class MethodSet():
+    """
+    The methods of a class that share an obfuscated name, indexed by their
+    line number ranges.
+
+    The index splits the line numbers into consecutive segments, each covered
+    by the same methods, so that the methods covering a line number are found
+    with a binary search.
+    """
+    __slots__ = ('methods', 'boundaries', 'segments')
+
+    def __init__(self):
+        self.methods = []
+        self.boundaries = None
+        self.segments = None
+
+    def __getstate__(self):
+        # The index is rebuilt when needed.
+        return self.methods
+
+    def __setstate__(self, methods):
+        self.methods = methods
+        self.boundaries = None
+        self.segments = None
+
+    def __iter__(self):
+        return iter(self.methods)
+
+    def __len__(self):
+        return len(self.methods)
+
+    def add(self, method_info):
+        self.methods.append(method_info)
+        self.boundaries = None
+
+    def candidates(self, line_number):
+        """
+        Returns the methods that may match the given line number, in the order
+        they were added.
+        """
+
+        if line_number == 0 or len(self.methods) <= METHOD_INDEX_THRESHOLD:
+            return self.methods
+
+        if self.boundaries is None:
+            self.build_index()
+
+        return self.segments[bisect_right(self.boundaries, line_number) - 1]
+
+    def build_index(self):
+        boundaries, segments = line_segments(self.methods)
+
+        self.segments = [[self.methods[index] for index in segment] for segment in segments]
+        self.boundaries = boundaries
+
+
+def line_segments(methods):
+    """
+    Splits the line numbers into consecutive segments, each covered by the
+    same methods. Returns the first line number of each segment, and the
+    indices of the methods covering each segment, in order. The first
+    segment starts at 0, and the methods without line numbers, which match
+    any line number, cover every segment.
+    """
+
+    # Methods without line numbers match any line number.
+    unranged = [index for index, method_info in enumerate(methods) if method_info.last_line_number == 0]
+
+    # Each method covers [first_line_number, last_line_number + 1).
+    starts = dict()
+    ends = dict()
+    for index, method_info in enumerate(methods):
+        if 0 < method_info.last_line_number and method_info.first_line_number <= method_info.last_line_number:
+            starts.setdefault(method_info.first_line_number, []).append(index)
+            ends.setdefault(method_info.last_line_number + 1, []).append(index)
+
+    boundaries = sorted(set(starts) | set(ends) | {0})
+    segments = []
+
+    active = set(unranged)
+    for boundary in boundaries:
+        active.difference_update(ends.get(boundary, ()))
+        active.update(starts.get(boundary, ()))
+
+        segments.append(sorted(active))
+
+    return boundaries, segments
+
+
 CLASS_PACKAGE_SEPARATOR = '.'
 JAVA_PACKAGE_SEPARATOR = '/'
 
+# The values the groups of a regular expression translate to, that fields
+# and methods depend on, and the slots of fields and methods themselves.
+CLASS_SLOT = 0
+LINE_NUMBER_SLOT = 1
+TYPE_SLOT = 2
+ARGUMENTS_SLOT = 3
+FIELD_SLOT = 4
+METHOD_SLOT = 5
+
 
 def external_class_name(internal_class_name):
     """
@@ -423,6 +828,82 @@ def external_class_name(internal_class_name):
     return internal_class_name.replace(JAVA_PACKAGE_SEPARATOR, CLASS_PACKAGE_SEPARATOR)
 
 
+def internal_class_name(external_class_name):
+    """
+    Converts an external class name into an internal class name.
+    """
+
+    return external_class_name.replace(CLASS_PACKAGE_SEPARATOR, JAVA_PACKAGE_SEPARATOR)
+
+
+def decode(text):
+    """
+    Returns the given bytes or text as text.
+    """
+
+    if isinstance(text, bytes):
+        return text.decode(BYTES_ENCODING, BYTES_ERRORS)
+    return text
+
+
+def read_binary_blocks(reader, block_size=READ_BLOCK_SIZE):
+    """
+    Reads a binary stream into a reusable buffer, yielding lists of the
+    complete lines read so far, without their line breaks.
+    """
+
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+
+    # Don't wait for the buffer to fill up if less is available.
+    readinto = getattr(reader, 'readinto1', reader.readinto)
+
+    tail = b''
+    while True:
+        count = readinto(buffer)
+        if not count:
+            break
+
+        lines = (tail + view[:count]).split(b'\n')
+        tail = lines.pop()
+
+        if lines:
+            yield lines
+
+    if tail:
+        yield [tail]
+
+
+def read_text_blocks(reader, encoding, errors=None, block_size=READ_BLOCK_SIZE):
+    """
+    Reads a binary stream like read_binary_blocks, yielding lists of the
+    complete lines read so far, decoded, without their line breaks.
+    """
+
+    errors = errors or 'strict'
+
+    for block in read_binary_blocks(reader, block_size):
+        lines = [line.decode(encoding, errors) for line in block]
+
+        # Drop the carriage returns of Windows line breaks, as text streams do.
+        yield [line[:-1] if line.endswith('\r') else line for line in lines]
+
+
+def is_regular_file(stream):
+    """
+    Returns whether the given stream reads a regular file, rather than e.g. a pipe.
+    """
+
+    try:
+        return stat.S_ISREG(os.fstat(stream.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def translate_line_number(match, simple_name):
+    return int(match), match
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Filter logcat by package name')
     parser.add_argument("--regex", "-r", dest="regex", default=STACK_TRACE_EXPRESSION,
@@ -433,16 +914,99 @@ def parse_args():
                         help="mapping file to deobfuscate against")
     parser.add_argument("--stacktrace", "-s", dest="stacktrace_file", default=None,
                         help="stack trace to deobfuscate. If none provided, Retrace will deobfuscate standard input")
+    parser.add_argument("--cache", action="store_true", dest="use_cache", default=False,
+                        help="load the mapping from its compiled copy, compiling it first if needed")
+    parser.add_argument("--cache-dir", dest="cache_dir", default=None,
+                        help="directory for compiled mappings. Defaults to the mapping file's directory")
+    parser.add_argument("--lazy", action="store_true", dest="lazy", default=False,
+                        help="only read the members of the classes that show up in the stack trace")
+    parser.add_argument("--cache-size", type=int, dest="cache_size", default=0,
+                        help="number of recently deobfuscated lines to remember")
+    parser.add_argument("--load-jobs", type=int, dest="load_jobs", default=1,
+                        help="number of processes parsing the mapping file")
+    parser.add_argument("--jobs", "-j", type=int, dest="jobs", default=1,
+                        help="number of processes deobfuscating the stack trace")
+    parser.add_argument("--flush-lines", type=int, dest="flush_lines", default=0,
+                        help="flush the output every this many lines. By default it's only flushed when buffers fill up")
+    parser.add_argument("--prefilter", action="store_true", dest="prefilter", default=False,
+                        help="pass lines without any obfuscated class name through as they are, without matching the regex")
+    parser.add_argument("--scan", action="store_true", dest="scan", default=False,
+                        help="deobfuscate class names anywhere in the input, instead of matching the regex")
+    parser.add_argument("--binary", action="store_true", dest="binary", default=False,
+                        help="process the input as bytes, only decoding what gets deobfuscated")
+    parser.add_argument("--dedupe", dest="dedupe", choices=('expand', 'aggregate'), default=None,
+                        help="deobfuscate each distinct stack trace once, and write all of them (expand), "
+                             "or each distinct one with its fingerprint and count as JSON (aggregate)")
+    parser.add_argument("--dedupe-traces", type=int, dest="dedupe_traces", default=DEDUPE_TRACES,
+                        help="number of distinct deobfuscated stack traces to remember with --dedupe expand, "
+                             "or 0 for all of them. Defaults to %d" % DEDUPE_TRACES)
+    parser.add_argument("--follow", "-f", action="store_true", dest="follow", default=False,
+                        help="keep reading the stack trace file as it grows, or standard input, writing each line as "
+                             "soon as it's read, and reload the mapping file when it changes")
+    parser.add_argument("--poll-interval", type=float, dest="poll_interval", default=0.5,
+                        help="seconds between checks for new lines and mapping changes, when following")
+    parser.add_argument("--stats", action="store_true", dest="stats", default=False,
+                        help="print counters and stage timings as JSON to standard error when done")
+    parser.add_argument("--compile", action="store_true", dest="compile", default=False,
+                        help="compile the mapping file for faster loading, then exit")
 
     options = parser.parse_args()
 
+    # Following flushes every line, and runs until interrupted.
+    if options.follow and (options.lazy or options.binary or options.dedupe or options.jobs > 1 or
+                           options.stats or options.flush_lines):
+        parser.error('--follow can\'t be combined with --lazy, --binary, --dedupe, --jobs, --stats or --flush-lines')
+
     return options
 
 
 def main():
+    if sys.argv[1:2] == ['serve']:
+        from pyretrace.server import main as serve
+        serve(sys.argv[2:])
+        return
+
     options = parse_args()
-    retrace = Retrace(options.mapping_file, options.verbose, options.regex, options.stacktrace_file)
-    retrace.execute()
+
+    try:
+        run(options)
+    except MappingError as ex:
+        print(ex)
+        sys.exit(1)
+
+
+def run(options):
+    if options.compile:
+        print(CompiledMappingReader(options.mapping_file, options.cache_dir, options.load_jobs).compile())
+        return
+
+    if options.follow:
+        from pyretrace.follow import MappingWatcher, follow, follow_lines
+
+        watcher = MappingWatcher(options.mapping_file, options.poll_interval,
+                                 verbose=options.verbose, regular_expression=options.regex,
+                                 use_cache=options.use_cache, cache_dir=options.cache_dir,
+                                 cache_size=options.cache_size, load_jobs=options.load_jobs,
+                                 prefilter=options.prefilter)
+        watcher.start()
+
+        try:
+            follow(watcher, follow_lines(options.stacktrace_file, options.poll_interval), scan=options.scan)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.stop()
+        return
+
+    retrace = Retrace(options.mapping_file, options.verbose, options.regex, options.stacktrace_file,
+                      use_cache=options.use_cache, cache_dir=options.cache_dir, lazy=options.lazy,
+                      cache_size=options.cache_size, load_jobs=options.load_jobs, prefilter=options.prefilter,
+                      stats=options.stats)
+    retrace.execute(options.jobs, flush_lines=options.flush_lines, scan=options.scan, binary=options.binary,
+                    dedupe=options.dedupe, dedupe_traces=options.dedupe_traces)
+
+    if options.stats:
+        print(json.dumps(retrace.stats(), indent=2, sort_keys=True), file=sys.stderr)
 
 
 if __name__ == "__main__":
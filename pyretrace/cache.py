@@ -0,0 +1,186 @@
+import hashlib
+import os
+import struct
+import tempfile
+
+from pyretrace.parallel import ParallelMappingReader
+from pyretrace.reader import MappingReader, is_path
+from pyretrace.stats import timed
+
+
+CACHE_MAGIC = b'PYRETRACE\x00'
+CACHE_FORMAT_VERSION = 2
+CACHE_SUFFIX = '.pyretrace'
+
+# Magic, version, then the size and modification time of the mapping file and
+# the digest of its contents, padded so that the tables after it are aligned.
+HEADER_FORMAT = '=10sB5xqq20s4x'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+READ_BLOCK_SIZE = 1 << 20
+
+
+def mapping_digest(mapping_file):
+    """
+    Returns the SHA-1 digest of the mapping file contents.
+    """
+
+    digest = hashlib.sha1()
+
+    with open(mapping_file, 'rb') as reader:
+        while True:
+            block = reader.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+
+            digest.update(block)
+
+    return digest.digest()
+
+
+class CompiledMappingReader():
+    """
+    A MappingReader that keeps a compiled, binary copy of the parsed mapping.
+
+    The compiled copy holds the flat tables of pyretrace.shared, which load()
+    maps so that they're looked up in place instead of parsing the mapping
+    text again. It's written either next to the mapping file or, if a
+    cache_dir is given, into that directory, keyed by the mapping file path.
+    It records the size, modification time and digest of the mapping file it
+    was compiled from; the mapping file is only hashed again when its size or
+    modification time differ. If it needs to be parsed, it's parsed with the
+    given number of processes. Mappings given as file objects or buffers are
+    parsed without a compiled copy.
+    """
+
+    def __init__(self, mapping_file, cache_dir=None, processes=1):
+        self.mapping_file = mapping_file
+        self.cache_dir = cache_dir
+        self.processes = processes
+        self.stats = None
+        self.digest = None
+
+    def mapping_reader(self):
+        if self.processes > 1:
+            reader = ParallelMappingReader(self.mapping_file, self.processes)
+        else:
+            reader = MappingReader(self.mapping_file)
+
+        reader.stats = self.stats
+        return reader
+
+    def cache_path(self):
+        if self.cache_dir:
+            # Many builds share the same mapping file name, so key by full path.
+            path_digest = hashlib.sha1(os.fsencode(os.path.abspath(self.mapping_file))).hexdigest()
+            return os.path.join(self.cache_dir, path_digest + CACHE_SUFFIX)
+        else:
+            return os.fspath(self.mapping_file) + CACHE_SUFFIX
+
+    def load(self):
+        """
+        Returns the SharedMappingTables of the compiled copy of the mapping
+        file, or None if there is no up to date compiled copy.
+        """
+
+        # Imported here, as pyretrace.shared imports pyretrace.
+        from pyretrace.shared import SharedMappingTables
+
+        if not is_path(self.mapping_file):
+            return None
+
+        status = os.stat(self.mapping_file)
+
+        with timed(self.stats, 'load.cache_read'):
+            try:
+                tables = SharedMappingTables.open(self.cache_path(), HEADER_SIZE)
+            except (IOError, OSError, ValueError):
+                return None
+
+        magic, version, size, modification_time, digest = struct.unpack_from(HEADER_FORMAT, tables.buffer)
+        if magic == CACHE_MAGIC and version == CACHE_FORMAT_VERSION:
+            if (size, modification_time) == (status.st_size, status.st_mtime_ns):
+                return tables
+
+            # It may have been touched or copied without changing.
+            with timed(self.stats, 'load.digest'):
+                self.digest = mapping_digest(self.mapping_file)
+
+            if digest == self.digest:
+                return tables
+
+        tables.close()
+        return None
+
+    def pump(self, mapping_processor):
+        """
+        Parses the mapping file into the given processor, e.g. a Retrace, and
+        writes the compiled copy of the maps it has built.
+        """
+
+        if not is_path(self.mapping_file):
+            self.mapping_reader().pump(mapping_processor)
+            return
+
+        # Taken before parsing, so that changes while parsing aren't missed.
+        status = os.stat(self.mapping_file)
+        if self.digest is None:
+            with timed(self.stats, 'load.digest'):
+                self.digest = mapping_digest(self.mapping_file)
+
+        self.mapping_reader().pump(mapping_processor)
+
+        try:
+            with timed(self.stats, 'load.cache_write'):
+                self.write(mapping_processor, status, self.digest)
+        except (IOError, OSError):
+            # A read-only location shouldn't prevent deobfuscation.
+            pass
+
+    def compile(self):
+        """
+        Parses the mapping file and writes its compiled copy, returning its path.
+        """
+
+        # Imported here, as pyretrace imports this module.
+        from pyretrace import Retrace
+
+        if not is_path(self.mapping_file):
+            raise ValueError('Only mapping files given by their path can be compiled')
+
+        status = os.stat(self.mapping_file)
+        digest = mapping_digest(self.mapping_file)
+
+        return self.write(Retrace(self.mapping_file, load_jobs=self.processes), status, digest)
+
+    def write(self, retrace, status, digest):
+        """
+        Writes the compiled copy of the maps of the given Retrace, for a mapping
+        file of the given status and digest.
+        """
+
+        from pyretrace.shared import compile_tables
+
+        tables = compile_tables(retrace.class_map, retrace.class_field_map, retrace.class_method_map)
+
+        path = self.cache_path()
+        directory = os.path.dirname(os.path.abspath(path))
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Write to a temporary file first so that concurrent loaders never
+        # see a partially written cache.
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=CACHE_SUFFIX + '.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as writer:
+                writer.write(struct.pack(HEADER_FORMAT, CACHE_MAGIC, CACHE_FORMAT_VERSION,
+                                         status.st_size, status.st_mtime_ns, digest))
+                writer.write(tables)
+
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        return path
@@ -0,0 +1,113 @@
+"""
+Deobfuscates stack frames already parsed into columns of class names, method
+names and line numbers, without going through text lines.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyretrace import line_segments
+
+
+# Line numbers take the low 32 bits of the search keys, methods the high ones.
+LINE_NUMBER_BITS = 32
+MAX_LINE_NUMBER = (1 << LINE_NUMBER_BITS) - 1
+
+
+def segment_methods(methods):
+    """
+    Returns the first line number of each segment of line_segments(), up to
+    MAX_LINE_NUMBER, and the index of the first method covering it, or -1 if
+    there's none.
+    """
+
+    boundaries, segments = line_segments(methods)
+
+    return ([min(boundary, MAX_LINE_NUMBER) for boundary in boundaries],
+            [segment[0] if segment else -1 for segment in segments])
+
+
+def deobfuscate_frames(retrace, class_names, method_names, line_numbers, simple_name=False):
+    """
+    Returns arrays of the original class names and method names of the frames
+    given by the obfuscated class names, method names and line numbers arrays,
+    with 0 for frames without a line number.
+
+    Names are the ones Retrace.deobfuscate() gives for a line such as
+    "at a.b.c(SourceFile:15)": the first matching method, or the obfuscated
+    name if there's none. Class names and class and method name pairs are only
+    looked up once each; the methods covering each line number are found with
+    a single sorted search over all of them.
+    """
+
+    if numpy is None:
+        raise ImportError('Deobfuscating frame arrays requires numpy')
+
+    class_names = numpy.asarray(class_names)
+    method_names = numpy.asarray(method_names)
+    line_numbers = numpy.clip(numpy.asarray(line_numbers, dtype=numpy.int64), 0, MAX_LINE_NUMBER)
+
+    if not (class_names.shape == method_names.shape == line_numbers.shape) or class_names.ndim != 1:
+        raise ValueError('Class names, method names and line numbers must be arrays of the same length')
+
+    # Integer code every distinct class name, method name, and pair of them.
+    unique_class_names, class_codes = numpy.unique(class_names, return_inverse=True)
+    unique_method_names, method_codes = numpy.unique(method_names, return_inverse=True)
+
+    pair_codes = class_codes.astype(numpy.int64) * len(unique_method_names) + method_codes
+    unique_pair_codes, pair_indices = numpy.unique(pair_codes, return_inverse=True)
+    pair_indices = pair_indices.reshape(-1)
+
+    original_class_names = [retrace.original_class_name(class_name, simple_name)
+                            for class_name in unique_class_names.tolist()]
+    unique_method_names = unique_method_names.tolist()
+
+    # For every pair, its methods and the first method matching from each
+    # boundary on, under keys that sort by pair, then by line number.
+    keys = []
+    first_methods = []
+    original_method_names = []
+    method_offsets = []
+
+    for pair_index, pair_code in enumerate(unique_pair_codes.tolist()):
+        class_code, method_code = divmod(pair_code, len(unique_method_names))
+        class_name = original_class_names[class_code]
+
+        retrace.load_class_members(class_name)
+
+        methods = ()
+        method_map = retrace.class_method_map.get(class_name)
+        if method_map:
+            methods = list(method_map.get(unique_method_names[method_code]) or ())
+
+        method_offsets.append(len(original_method_names))
+        original_method_names.extend(method_info.original_name for method_info in methods)
+
+        boundaries, boundary_methods = segment_methods(methods)
+        keys.extend((pair_index << LINE_NUMBER_BITS) | boundary for boundary in boundaries)
+        first_methods.extend(boundary_methods)
+
+    keys = numpy.array(keys, dtype=numpy.int64)
+    first_methods = numpy.array(first_methods, dtype=numpy.int64)
+    method_offsets = numpy.array(method_offsets, dtype=numpy.int64)
+
+    # Every pair has a key for line number 0, so each frame finds one of its own.
+    frame_keys = (pair_indices.astype(numpy.int64) << LINE_NUMBER_BITS) | line_numbers
+    frame_methods = first_methods[numpy.searchsorted(keys, frame_keys, side='right') - 1]
+
+    # Without a line number, any method matches, so the first one does.
+    has_methods = method_offsets[pair_indices] < numpy.append(method_offsets[1:], len(original_method_names))[pair_indices]
+    frame_methods = numpy.where(line_numbers == 0, numpy.where(has_methods, 0, -1), frame_methods)
+
+    found = frame_methods >= 0
+    method_indices = method_offsets[pair_indices] + numpy.where(found, frame_methods, 0)
+
+    result_class_names = numpy.array(original_class_names, dtype=object)[class_codes.reshape(-1)]
+
+    result_method_names = numpy.array(method_names, dtype=object)
+    if original_method_names:
+        original_method_names = numpy.array(original_method_names, dtype=object)
+        result_method_names[found] = original_method_names[method_indices[found]]
+
+    return result_class_names, result_method_names
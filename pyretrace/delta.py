@@ -0,0 +1,155 @@
+"""
+Loads the mapping of a build as a delta against the already loaded mapping
+of a previous build, as consecutive builds share most of their classes.
+"""
+import hashlib
+import mmap
+from sys import intern
+
+from pyretrace.reader import CLASS_MAPPING_EXPRESSION, MappingError, MappingReader, is_compressed, is_path
+from pyretrace.stats import timed
+
+
+def class_sections(buffer):
+    """
+    Yields the class mapping line, start and end of each class section of a
+    mapping: its class mapping line and the member mappings following it.
+    """
+
+    start = None
+    header = None
+
+    for match in CLASS_MAPPING_EXPRESSION.finditer(buffer):
+        if start is not None:
+            yield header, start, match.start()
+
+        header = match.group(0)
+        start = match.start()
+
+    if start is not None:
+        yield header, start, len(buffer)
+
+
+def section_class_name(header):
+    return header.split(b'->', 1)[0].strip().decode('utf-8')
+
+
+def section_digests(buffer, sections):
+    """
+    Returns the digest of each class section, by original class name. Classes
+    with more than one section map to None.
+    """
+
+    digests = dict()
+    for header, start, end in sections:
+        class_name = section_class_name(header)
+        digests[class_name] = None if class_name in digests else hashlib.sha1(buffer[start: end]).digest()
+
+    return digests
+
+
+def mapping_section_digests(mapping_file):
+    """
+    Returns the digests of the class sections of a mapping file, or an empty
+    dictionary if it isn't a plain file.
+    """
+
+    if not is_path(mapping_file) or is_compressed(mapping_file):
+        return dict()
+
+    with open(mapping_file, 'rb') as reader:
+        if reader.seek(0, 2) == 0:
+            return dict()
+
+        buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return section_digests(buffer, list(class_sections(buffer)))
+        finally:
+            buffer.close()
+
+
+class DeltaMappingReader():
+    """
+    A MappingReader for a Retrace that reuses the field and method maps of the
+    classes of a base Retrace whose class sections are unchanged, and only
+    parses the others. Reused maps are shared, not copied, as a loaded
+    Retrace never changes them. The section digests of the mapping are kept
+    in the Retrace's section_digests, for the next build to be diffed against.
+    Compressed mapping files, file objects and buffers are parsed whole.
+    """
+
+    def __init__(self, mapping_file, base):
+        self.mapping_file = mapping_file
+        self.base = base
+
+        self.reused = 0
+        self.parsed = 0
+
+        self.stats = None
+
+    def base_digests(self):
+        base = self.base
+        if base.section_digests is None:
+            base.section_digests = mapping_section_digests(base.mapping_file)
+
+        return base.section_digests
+
+    def pump(self, mapping_processor):
+        if not is_path(self.mapping_file) or is_compressed(self.mapping_file):
+            mapping_processor.section_digests = dict()
+
+            reader = MappingReader(self.mapping_file)
+            reader.stats = self.stats
+            reader.pump(mapping_processor)
+            return
+
+        try:
+            with open(self.mapping_file, 'rb') as reader:
+                if reader.seek(0, 2) == 0:
+                    mapping_processor.section_digests = dict()
+                    return
+
+                buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    with timed(self.stats, 'load.scan'):
+                        sections = list(class_sections(buffer))
+                        digests = section_digests(buffer, sections)
+                        base_digests = self.base_digests()
+
+                    for header, start, end in sections:
+                        class_name = section_class_name(header)
+                        digest = digests[class_name]
+
+                        if digest is not None and digest == base_digests.get(class_name):
+                            self.reuse_class(header, class_name, mapping_processor)
+                        else:
+                            lines = buffer[start: end].decode('utf-8').splitlines()
+                            MappingReader.process_lines(lines, mapping_processor)
+                            self.parsed += 1
+                finally:
+                    buffer.close()
+
+            mapping_processor.section_digests = digests
+
+        except Exception as ex:
+            raise MappingError('Can\'t process mapping file (%s)' % ex) from ex
+
+    def reuse_class(self, header, class_name, mapping_processor):
+        line = header.decode('utf-8').strip()
+        if not MappingReader.process_class_mapping(line, mapping_processor):
+            return
+
+        base = self.base
+        base.load_class_members(class_name)
+
+        class_name = intern(class_name)
+
+        field_map = base.class_field_map.get(class_name)
+        if field_map is not None:
+            mapping_processor.class_field_map[class_name] = field_map
+
+        method_map = base.class_method_map.get(class_name)
+        if method_map is not None:
+            mapping_processor.class_method_map[class_name] = method_map
+
+        self.reused += 1
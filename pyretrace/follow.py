@@ -0,0 +1,179 @@
+"""
+Follows a growing log, deobfuscating and writing each line as soon as it's
+read, while the mapping file is watched and reloaded in the background.
+"""
+import os
+import sys
+import threading
+import time
+
+from pyretrace import Retrace
+from pyretrace.delta import mapping_section_digests
+
+
+# Seconds between checks for new lines in a followed file, and for changes
+# to the mapping file.
+POLL_INTERVAL = 0.5
+
+
+def file_identity(path):
+    """
+    Returns what tells a version of a file from another, or None if it
+    doesn't exist.
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def follow_lines(path=None, poll_interval=POLL_INTERVAL):
+    """
+    Yields the lines of a file, without their line breaks, then the lines
+    appended to it as they're written, like "tail -F": if the file is
+    truncated or replaced, it's read again from its start. Without a path,
+    yields the lines of the standard input as they come, until it ends.
+    """
+
+    if path is None:
+        for line in iter(sys.stdin.readline, ''):
+            yield line.rstrip('\n')
+        return
+
+    reader = open(path, 'r')
+    try:
+        partial = ''
+
+        while True:
+            line = reader.readline()
+            if line.endswith('\n'):
+                yield partial + line[:-1]
+                partial = ''
+                continue
+
+            # Keep an incomplete last line until the rest of it is written.
+            partial += line
+
+            time.sleep(poll_interval)
+
+            identity = file_identity(path)
+            if identity is not None and \
+               (identity[0] != os.fstat(reader.fileno()).st_ino or identity[1] < reader.tell()):
+                reader.close()
+                reader = open(path, 'r')
+                partial = ''
+    finally:
+        reader.close()
+
+
+class MappingWatcher():
+    """
+    Holds the Retrace of a mapping file, checking the file for changes in a
+    background thread. A changed mapping is loaded in that thread, as a delta
+    against the current one where possible, and swapped in once it's
+    complete, so readers of retrace never wait for it. A mapping that can't
+    be loaded leaves the current one in place.
+    """
+
+    def __init__(self, mapping_file, poll_interval=POLL_INTERVAL, log=None, **retrace_options):
+        self.mapping_file = mapping_file
+        self.poll_interval = poll_interval
+        self.log = log or sys.stderr
+        self.retrace_options = retrace_options
+
+        self.reloads = 0
+        self.reload_failures = 0
+
+        self.retrace, self.identity = self.load(None)
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='pyretrace-mapping-watcher')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def load(self, base):
+        """
+        Returns a Retrace of the mapping file, and the identity of the file
+        version it was read from.
+        """
+
+        identity = file_identity(self.mapping_file)
+
+        # Only a base whose digests are those of what it loaded can be diffed
+        # against, as its mapping file has changed since.
+        if base is not None and base.section_digests is None:
+            base = None
+
+        retrace = Retrace(self.mapping_file, base=base, **self.retrace_options)
+
+        if retrace.section_digests is None:
+            section_digests = mapping_section_digests(self.mapping_file)
+            if file_identity(self.mapping_file) == identity:
+                retrace.section_digests = section_digests
+
+        return retrace, identity
+
+    def run(self):
+        pending_identity = None
+
+        while not self.stopped.wait(self.poll_interval):
+            identity = file_identity(self.mapping_file)
+            if identity is None or identity == self.identity:
+                pending_identity = None
+                continue
+
+            # Wait for the file to stay the same for a while, so that it isn't
+            # loaded while it's being written.
+            if identity != pending_identity:
+                pending_identity = identity
+                continue
+
+            self.reload()
+            pending_identity = None
+
+    def reload(self):
+        start = time.time()
+
+        try:
+            retrace, identity = self.load(self.retrace)
+        except Exception as ex:
+            self.reload_failures += 1
+            print('Can\'t reload mapping file %s (%s: %s)' % (self.mapping_file, type(ex).__name__, ex),
+                  file=self.log)
+            return
+
+        self.retrace = retrace
+        self.identity = identity
+        self.reloads += 1
+
+        print('Reloaded mapping file %s in %.2f s' % (self.mapping_file, time.time() - start), file=self.log)
+
+
+def follow(watcher, lines, output=None, scan=False):
+    """
+    Deobfuscates the given lines with the watcher's current Retrace, writing
+    and flushing each one as soon as it's read.
+    """
+
+    output = output or sys.stdout
+
+    for line in lines:
+        retrace = watcher.retrace
+
+        if scan:
+            line = retrace.deobfuscate_class_names(line)
+        else:
+            line = retrace.deobfuscate(line, False)
+
+        output.write(line + '\n')
+        output.flush()
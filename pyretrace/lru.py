@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache():
+    """
+    A thread safe, least recently used cache, bounded by its number of entries
+    and/or by the total weight of its values.
+    """
+
+    def __init__(self, max_entries=None, max_weight=None, weigh=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigh = weigh
+
+        self.entries = OrderedDict()
+        self.weights = dict()
+        self.weight = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for the given key, marking it as recently
+        used, or the default if it isn't cached.
+        """
+
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def peek(self, key, default=None):
+        """
+        Returns the cached value for the given key without counting it as a hit
+        or a miss, or changing its position.
+        """
+
+        with self.lock:
+            return self.entries.get(key, default)
+
+    def most_recent(self, default=None):
+        """
+        Returns the most recently used value, without counting it as a hit.
+        """
+
+        with self.lock:
+            for value in reversed(self.entries.values()):
+                return value
+
+            return default
+
+    def put(self, key, value):
+        weight = self.weigh(value) if self.weigh else 1
+
+        with self.lock:
+            if key in self.entries:
+                self.weight -= self.weights[key]
+
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.weights[key] = weight
+            self.weight += weight
+
+            # Evict the least recently used entries, but always keep the new one.
+            while len(self.entries) > 1 and self.over_limit():
+                evicted_key, _ = self.entries.popitem(last=False)
+                self.weight -= self.weights.pop(evicted_key)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+
+            self.weight -= self.weights.pop(key)
+            return self.entries.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.weights.clear()
+            self.weight = 0
+
+    def over_limit(self):
+        return (self.max_entries is not None and len(self.entries) > self.max_entries) or \
+               (self.max_weight is not None and self.weight > self.max_weight)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'weight': self.weight,
+            }
@@ -0,0 +1,243 @@
+import gc
+import itertools
+import mmap
+import multiprocessing
+from collections import deque
+
+from pyretrace.reader import (CLASS_MAPPING_EXPRESSION, MappingError, MappingReader, MappingRecorder, is_compressed,
+                              is_path, replay_mapping)
+from pyretrace.stats import timed
+
+
+# Chunks per process, so that uneven chunks still keep all processes busy.
+CHUNKS_PER_PROCESS = 4
+
+# Stack trace lines sent to a worker process at a time.
+LINES_PER_CHUNK = 4096
+
+
+def split_mapping(mapping_file, chunks):
+    """
+    Splits the mapping file into at most the given number of byte ranges, each
+    starting at a class mapping line.
+    """
+
+    with open(mapping_file, 'rb') as reader:
+        size = reader.seek(0, 2)
+        if size == 0:
+            return []
+
+        buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            boundaries = [0]
+
+            for chunk_index in range(1, chunks):
+                target = max(size * chunk_index // chunks, boundaries[-1] + 1)
+                if target >= size:
+                    break
+
+                match = CLASS_MAPPING_EXPRESSION.search(buffer, target)
+                if match is None:
+                    break
+
+                if match.start() > boundaries[-1]:
+                    boundaries.append(match.start())
+
+            boundaries.append(size)
+        finally:
+            buffer.close()
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_chunk(chunk):
+    mapping_file, start, end = chunk
+
+    with open(mapping_file, 'rb') as reader:
+        reader.seek(start)
+        return reader.read(end - start).decode('utf-8').splitlines()
+
+
+def parse_chunk(chunk):
+    """
+    Parses a byte range of a mapping file, returning the recorded mappings.
+    """
+
+    recorder = MappingRecorder()
+    MappingReader.process_lines(read_chunk(chunk), recorder)
+
+    return recorder.records
+
+
+def parse_chunk_maps(chunk):
+    """
+    Parses a byte range of a mapping file, returning its class, field and
+    method maps.
+    """
+
+    # Imported here, as pyretrace imports this module.
+    from pyretrace import MappingMaps
+
+    maps = MappingMaps()
+    MappingReader.process_lines(read_chunk(chunk), maps)
+
+    return maps.class_map, maps.class_field_map, maps.class_method_map
+
+
+def merge_maps(maps, mapping_processor):
+    """
+    Merges the maps of a chunk into those of the given MappingMaps.
+    """
+
+    from pyretrace import MethodSet
+
+    class_map, class_field_map, class_method_map = maps
+
+    mapping_processor.class_map.update(class_map)
+    merge_member_maps(mapping_processor.class_field_map, class_field_map, list.append)
+    merge_member_maps(mapping_processor.class_method_map, class_method_map, MethodSet.add)
+
+
+def merge_member_maps(class_member_map, chunk_class_member_map, add):
+    """
+    Merges original class name -> obfuscated name -> fields or methods maps.
+    Chunks start at class mappings, so a class only shows up in several of
+    them if it's mapped more than once; its members are then added one by
+    one, as they were parsed.
+    """
+
+    for class_name in class_member_map.keys() & chunk_class_member_map.keys():
+        member_map = class_member_map[class_name]
+        for obfuscated_name, member_set in chunk_class_member_map.pop(class_name).items():
+            if obfuscated_name in member_map:
+                for member_info in member_set:
+                    add(member_map[obfuscated_name], member_info)
+            else:
+                member_map[obfuscated_name] = member_set
+
+    class_member_map.update(chunk_class_member_map)
+
+
+class ParallelMappingReader():
+    """
+    A MappingReader that parses chunks of the mapping file in a pool of
+    processes. For a MappingMaps processor, e.g. a Retrace, each process
+    builds the maps of its chunks, which are merged into the processor's in
+    file order. Other processors are passed the parsed mappings in file
+    order, so they get the very same callbacks as from a MappingReader.
+    Compressed mapping files, file objects and buffers can't be split, so
+    they're read by a MappingReader.
+    """
+
+    def __init__(self, mapping_file, processes=None):
+        self.mapping_file = mapping_file
+        self.processes = processes or multiprocessing.cpu_count()
+        self.stats = None
+
+    def pump(self, mapping_processor):
+        if not is_path(self.mapping_file) or is_compressed(self.mapping_file):
+            reader = MappingReader(self.mapping_file)
+            reader.stats = self.stats
+            reader.pump(mapping_processor)
+            return
+
+        try:
+            with timed(self.stats, 'load.split'):
+                chunks = [(self.mapping_file, start, end)
+                          for start, end in split_mapping(self.mapping_file, self.processes * CHUNKS_PER_PROCESS)]
+
+            with timed(self.stats, 'load.parse'):
+                self.parse_chunks(chunks, mapping_processor)
+
+        except Exception as ex:
+            raise MappingError('Can\'t process mapping file (%s)' % ex) from ex
+
+    def parse_chunks(self, chunks, mapping_processor):
+        from pyretrace import MappingMaps
+
+        if self.processes <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                MappingReader.process_lines(read_chunk(chunk), mapping_processor)
+            return
+
+        # Merging whole maps is much cheaper than replaying every mapping.
+        if isinstance(mapping_processor, MappingMaps):
+            parse, merge = parse_chunk_maps, merge_maps
+        else:
+            parse, merge = parse_chunk, replay_mapping
+
+        # Everything unpickled is kept, so collecting garbage on the way would
+        # only scan the growing maps over and over.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for result in pool.imap(parse, chunks):
+                merge(result, mapping_processor)
+        finally:
+            pool.terminate()
+            pool.join()
+
+            if gc_enabled:
+                gc.enable()
+
+
+# The Retrace used by a worker process.
+worker_retrace = None
+
+
+def init_worker(retrace):
+    global worker_retrace
+    worker_retrace = retrace
+
+
+def deobfuscate_chunk(chunk):
+    lines, simple_name, scan = chunk
+
+    if scan:
+        return [worker_retrace.deobfuscate_class_names(line, simple_name) for line in lines]
+    else:
+        return [worker_retrace.deobfuscate(line, simple_name) for line in lines]
+
+
+def pool_context():
+    # Forked workers share the loaded mapping with the parent, copy-on-write,
+    # instead of receiving a pickled copy of it.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    else:
+        return multiprocessing.get_context()
+
+
+def deobfuscate_parallel(retrace, lines, processes=None, simple_name=False, chunk_size=LINES_PER_CHUNK, scan=False):
+    """
+    Deobfuscates the given lines in a pool of processes, yielding the results
+    in the same order as the lines. Only a few chunks of lines are in flight at
+    any time, so lines may come from an arbitrarily large stream.
+    """
+
+    processes = processes or multiprocessing.cpu_count()
+    lines = iter(lines)
+
+    pool = pool_context().Pool(processes, init_worker, (retrace,))
+    try:
+        pending = deque()
+
+        while True:
+            # Keep every process busy, with the next chunk already queued.
+            while len(pending) < processes * 2:
+                chunk = list(itertools.islice(lines, chunk_size))
+                if not chunk:
+                    break
+
+                pending.append(pool.apply_async(deobfuscate_chunk, ((chunk, simple_name, scan),)))
+
+            if not pending:
+                break
+
+            for output in pending.popleft().get():
+                yield output
+    finally:
+        pool.terminate()
+        pool.join()
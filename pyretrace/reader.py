@@ -1,44 +1,163 @@
-from __future__ import print_function
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import mmap
+import os
+import re
+import threading
 
-import sys
+from pyretrace.stats import timed
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAPPING_ENCODING = 'utf-8'
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTANDARD_MAGIC = b'\x28\xb5\x2f\xfd'
+MAGIC_SIZE = 6
+
+
+class MappingError(Exception):
+    """
+    Raised when a mapping file can't be read.
+    """
+
+
+def decompressing_reader(binary_reader, magic):
+    """
+    Returns a binary stream decompressing the given one, according to the magic
+    bytes it starts with, or the stream itself if it isn't compressed.
+    """
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=binary_reader, mode='rb')
+    elif magic.startswith(BZIP2_MAGIC):
+        return bz2.BZ2File(binary_reader, 'rb')
+    elif magic.startswith(XZ_MAGIC):
+        return lzma.LZMAFile(binary_reader, 'rb')
+    elif magic.startswith(ZSTANDARD_MAGIC):
+        if zstandard is None:
+            raise ImportError('Reading zstd compressed mappings requires the zstandard package')
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(binary_reader, closefd=False))
+    else:
+        return binary_reader
+
+
+def is_path(mapping_file):
+    """
+    Returns whether the mapping file is given by its path, rather than as a
+    file object or a buffer.
+    """
+
+    return isinstance(mapping_file, (str, os.PathLike))
+
+
+def is_compressed(mapping_file):
+    """
+    Returns whether the mapping file at the given path is compressed.
+    """
+
+    with open(mapping_file, 'rb') as reader:
+        magic = reader.read(MAGIC_SIZE)
+
+    return magic.startswith((GZIP_MAGIC, BZIP2_MAGIC, XZ_MAGIC, ZSTANDARD_MAGIC))
 
 
 class MappingReader():
+    """
+    Reads a mapping from a file path, a file-like object (text or binary), or a
+    buffer such as bytes or an mmap. Binary input may be compressed with gzip,
+    bzip2, xz or, if the zstandard package is installed, zstd; it's
+    decompressed while it's being read.
+    """
+
     def __init__(self, mapping_file):
         self.mapping_file = mapping_file
 
+        # The RetraceStats timing the loading phases, if any.
+        self.stats = None
+
     def pump(self, mapping_processor):
+        with contextlib.ExitStack() as resources:
+            # A mapping file that can't be opened is the caller's error, not the mapping's.
+            with timed(self.stats, 'load.open'):
+                lines = self.open(resources)
 
-        reader = open(self.mapping_file, 'r')
+            try:
+                with timed(self.stats, 'load.parse'):
+                    self.process_lines(lines, mapping_processor)
+            except Exception as ex:
+                raise MappingError('Can\'t process mapping file (%s)' % ex) from ex
 
-        try:
-            class_name = None
+    def open(self, resources):
+        """
+        Returns a text stream of the mapping. Whatever needs to be closed, or
+        detached from the caller's stream, is registered with the given ExitStack.
+        """
+
+        source = self.mapping_file
 
-            # Read the subsequent class mappings and class member mappings.
-            while True:
-                line = reader.readline()
+        if isinstance(source, io.TextIOBase):
+            return source
 
-                if not line:
-                    break
+        if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            binary_reader = io.BytesIO(source)
+            magic = bytes(source[:MAGIC_SIZE])
+        elif hasattr(source, 'read'):
+            binary_reader = source
+            if hasattr(binary_reader, 'peek'):
+                magic = binary_reader.peek(MAGIC_SIZE)[:MAGIC_SIZE]
+            elif binary_reader.seekable():
+                position = binary_reader.tell()
+                magic = binary_reader.read(MAGIC_SIZE)
+                binary_reader.seek(position)
+            else:
+                binary_reader = io.BufferedReader(source)
+                resources.callback(binary_reader.detach)
+                magic = binary_reader.peek(MAGIC_SIZE)[:MAGIC_SIZE]
+        else:
+            binary_reader = open(source, 'rb')
+            resources.callback(binary_reader.close)
+            magic = binary_reader.peek(MAGIC_SIZE)[:MAGIC_SIZE]
 
-                line = line.strip()
+        decompressed_reader = decompressing_reader(binary_reader, magic)
+        if decompressed_reader is not binary_reader:
+            resources.callback(decompressed_reader.close)
 
-                # The distinction between a class mapping and a class
-                # member mapping is the initial whitespace.
-                if line.endswith(':'):
-                    # Process the class mapping and remember the class's
-                    # old name.
-                    class_name = self.process_class_mapping(line, mapping_processor)
-                elif class_name is not None:
-                    # Process the class member mapping, in the context of the
-                    # current old class name.
-                    self.process_class_member_mapping(class_name, line, mapping_processor)
+        # Mappings are read as text: the maps are keyed by the names as str, and
+        # decoding takes about 1% of the time it takes to parse them.
+        # Don't let the text stream close the caller's stream when it's collected.
+        text_reader = io.TextIOWrapper(decompressed_reader, encoding=MAPPING_ENCODING)
+        resources.callback(text_reader.detach)
 
-        except Exception as ex:
-            print('Can\'t process mapping file (%s)' % ex)
-            sys.exit(1)
-        finally:
-            reader.close()
+        return text_reader
+
+    @staticmethod
+    def process_lines(lines, mapping_processor):
+        class_name = None
+
+        # Read the subsequent class mappings and class member mappings.
+        for line in lines:
+            line = line.strip()
+
+            # The distinction between a class mapping and a class
+            # member mapping is the initial whitespace.
+            if line.endswith(':'):
+                # Process the class mapping and remember the class's
+                # old name.
+                class_name = MappingReader.process_class_mapping(line, mapping_processor)
+            elif class_name is not None:
+                # Process the class member mapping, in the context of the
+                # current old class name.
+                MappingReader.process_class_member_mapping(class_name, line, mapping_processor)
 
     @staticmethod
     def process_class_mapping(line, mapping_processor):
@@ -111,3 +230,187 @@ class MappingReader():
                                                          name,
                                                          arguments,
                                                          new_name)
+
+
+# A class mapping line, "___ -> ___:", is the only kind of line ending in a colon.
+CLASS_MAPPING_EXPRESSION = re.compile(b'^([^\n]*):[ \t\r]*$', re.MULTILINE)
+
+
+class LazyMappingReader():
+    """
+    A MappingReader that only processes the class mappings up front, recording
+    where each class's member mappings are in the file. The member mappings of
+    a class are processed the first time load_class() is called for it.
+    """
+
+    def __init__(self, mapping_file):
+        self.mapping_file = mapping_file
+        self.class_sections = dict()
+        self.lock = threading.Lock()
+        self.stats = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def pump(self, mapping_processor):
+        if not is_path(self.mapping_file):
+            raise ValueError('Can\'t lazily load a mapping from a file object or buffer')
+
+        if is_compressed(self.mapping_file):
+            raise MappingError('Can\'t lazily load a compressed mapping file')
+
+        reader = open(self.mapping_file, 'rb')
+
+        try:
+            if reader.seek(0, 2) == 0:
+                return
+
+            buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                with timed(self.stats, 'load.scan'):
+                    self.scan(buffer, mapping_processor)
+            finally:
+                buffer.close()
+
+        except Exception as ex:
+            raise MappingError('Can\'t process mapping file (%s)' % ex) from ex
+        finally:
+            reader.close()
+
+    def scan(self, buffer, mapping_processor):
+        """
+        Processes the class mappings of the mapped file, recording the sections
+        of their member mappings.
+        """
+
+        class_name = None
+        section_start = 0
+
+        for match in CLASS_MAPPING_EXPRESSION.finditer(buffer):
+            self.add_section(class_name, section_start, match.start())
+
+            line = match.group(0).decode('utf-8').strip()
+            class_name = MappingReader.process_class_mapping(line, mapping_processor)
+            section_start = match.end()
+
+        self.add_section(class_name, section_start, len(buffer))
+
+    def add_section(self, class_name, start, end):
+        if class_name is not None and end > start:
+            self.class_sections.setdefault(class_name, []).append((start, end))
+
+    def load_class(self, class_name, mapping_processor):
+        """
+        Processes the member mappings of the given class, if they haven't been
+        processed yet.
+        """
+
+        if class_name not in self.class_sections:
+            return
+
+        with self.lock:
+            # Another thread may have loaded it while we were waiting.
+            sections = self.class_sections.get(class_name)
+            if sections is None:
+                return
+
+            try:
+                with timed(self.stats, 'load.members'), open(self.mapping_file, 'rb') as reader:
+                    for start, end in sections:
+                        reader.seek(start)
+
+                        for line in reader.read(end - start).decode('utf-8').splitlines():
+                            line = line.strip()
+                            if line:
+                                MappingReader.process_class_member_mapping(class_name, line, mapping_processor)
+            except Exception as ex:
+                raise MappingError('Can\'t process mapping file (%s)' % ex) from ex
+
+            # Only forget the class once it's complete, so that concurrent
+            # lookups wait for it.
+            del self.class_sections[class_name]
+
+
+CLASS_RECORD = 'c'
+FIELD_RECORD = 'f'
+METHOD_RECORD = 'm'
+
+
+class MappingRecorder():
+    """
+    A MappingProcessor that records every callback as a flat tuple, optionally
+    forwarding it to another processor. The records can later be fed to any
+    processor with replay_mapping(), yielding the exact same callback sequence.
+    """
+
+    def __init__(self, mapping_processor=None):
+        self.mapping_processor = mapping_processor
+        self.records = []
+
+    def process_class_mapping(self, class_name, new_class_name):
+        self.records.append((CLASS_RECORD, class_name, new_class_name))
+
+        if self.mapping_processor is not None:
+            self.mapping_processor.process_class_mapping(class_name, new_class_name)
+
+        return True
+
+    def process_field_mapping(self, class_name, field_type, field_name, new_field_name):
+        self.records.append((FIELD_RECORD, class_name, field_type, field_name, new_field_name))
+
+        if self.mapping_processor is not None:
+            self.mapping_processor.process_field_mapping(class_name, field_type, field_name, new_field_name)
+
+    def process_method_mapping(self,
+                               class_name,
+                               first_line_number,
+                               last_line_number,
+                               method_return_type,
+                               method_name,
+                               method_arguments,
+                               new_method_name):
+        self.records.append((METHOD_RECORD,
+                             class_name,
+                             first_line_number,
+                             last_line_number,
+                             method_return_type,
+                             method_name,
+                             method_arguments,
+                             new_method_name))
+
+        if self.mapping_processor is not None:
+            self.mapping_processor.process_method_mapping(class_name,
+                                                          first_line_number,
+                                                          last_line_number,
+                                                          method_return_type,
+                                                          method_name,
+                                                          method_arguments,
+                                                          new_method_name)
+
+
+def replay_mapping(records, mapping_processor):
+    """
+    Feeds records produced by a MappingRecorder to the given processor. Members
+    of classes the processor isn't interested in are skipped, as MappingReader
+    would.
+    """
+
+    interested = False
+
+    for record in records:
+        kind = record[0]
+
+        if kind == CLASS_RECORD:
+            interested = mapping_processor.process_class_mapping(record[1], record[2])
+        elif not interested:
+            continue
+        elif kind == METHOD_RECORD:
+            mapping_processor.process_method_mapping(*record[1:])
+        else:
+            mapping_processor.process_field_mapping(*record[1:])
@@ -0,0 +1,124 @@
+"""
+Looks up the obfuscated names of original classes and members, the other
+way around from a Retrace, e.g. to search obfuscated logs.
+"""
+from bisect import bisect_left
+
+
+class ReverseIndex():
+    """
+    Original class, field and method names -> obfuscated names, of a loaded
+    Retrace. The class index is built from the class map when created, and
+    the member index of each class from its field and method maps the first
+    time the class is looked up, so members of a lazily read mapping are only
+    read for the classes asked about.
+    """
+
+    def __init__(self, retrace):
+        self.retrace = retrace
+
+        # Original class name -> obfuscated class names, in mapping order.
+        self.classes = dict()
+        for obfuscated_class_name, class_name in retrace.class_map.items():
+            self.classes.setdefault(class_name, []).append(obfuscated_class_name)
+
+        # Sorted original class names, for prefix queries.
+        self.class_names = sorted(self.classes)
+
+        # Original class name -> (original field name -> obfuscated names,
+        # original method name -> obfuscated names).
+        self.members = dict()
+
+    def obfuscated_class_names(self, class_name):
+        """
+        Returns the obfuscated names of the given original class.
+        """
+
+        return list(self.classes.get(class_name, ()))
+
+    def classes_with_prefix(self, prefix):
+        """
+        Returns (original class name, obfuscated class name) pairs of the
+        classes whose original names start with the given prefix, e.g. a
+        package name followed by a dot, sorted by original name.
+        """
+
+        class_names = self.class_names
+        matches = []
+
+        index = bisect_left(class_names, prefix)
+        while index < len(class_names) and class_names[index].startswith(prefix):
+            class_name = class_names[index]
+            matches.extend((class_name, obfuscated_class_name) for obfuscated_class_name in self.classes[class_name])
+            index += 1
+
+        return matches
+
+    def obfuscated_field_names(self, class_name, field_name):
+        """
+        Returns the obfuscated names of the given field of an original class.
+        """
+
+        return list(self.member_index(class_name)[0].get(field_name, ()))
+
+    def obfuscated_method_names(self, class_name, method_name):
+        """
+        Returns the obfuscated names of the given method of an original
+        class, of all its overloads.
+        """
+
+        return list(self.member_index(class_name)[1].get(method_name, ()))
+
+    def lookup(self, name):
+        """
+        Returns (obfuscated class name, obfuscated member name) pairs for a
+        fully qualified original class name, with None as member name, or
+        else for a class name followed by a method or field name, e.g.
+        com.example.FooActivity.onResume. Methods come before fields.
+        """
+
+        if name in self.classes:
+            return [(obfuscated_class_name, None) for obfuscated_class_name in self.classes[name]]
+
+        class_name, _, member_name = name.rpartition('.')
+        obfuscated_class_names = self.classes.get(class_name)
+        if not obfuscated_class_names:
+            return []
+
+        obfuscated_member_names = self.obfuscated_method_names(class_name, member_name) + \
+            self.obfuscated_field_names(class_name, member_name)
+
+        return [(obfuscated_class_name, obfuscated_member_name)
+                for obfuscated_class_name in obfuscated_class_names
+                for obfuscated_member_name in obfuscated_member_names]
+
+    def member_index(self, class_name):
+        members = self.members.get(class_name)
+        if members is None:
+            retrace = self.retrace
+            retrace.load_class_members(class_name)
+
+            members = (reverse_member_map(retrace.class_field_map.get(class_name)),
+                       reverse_member_map(retrace.class_method_map.get(class_name)))
+            self.members[class_name] = members
+
+        return members
+
+
+def reverse_member_map(member_map):
+    """
+    Turns an obfuscated name -> fields or methods map into an original name
+    -> distinct obfuscated names one.
+    """
+
+    names = dict()
+    if not member_map:
+        return names
+
+    for obfuscated_name, member_set in member_map.items():
+        for member_info in member_set:
+            obfuscated_names = names.setdefault(member_info.original_name, [])
+            if obfuscated_name not in obfuscated_names:
+                obfuscated_names.append(obfuscated_name)
+
+    return names
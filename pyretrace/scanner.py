@@ -0,0 +1,174 @@
+import re
+
+
+# A dotted identifier starting with one of the given first parts, and that
+# isn't the tail of a longer one.
+IDENTIFIER_PATH_EXPRESSION = '(?<![A-Za-z0-9_$.])(?:%s)(?![A-Za-z0-9_$])(?:\\.[A-Za-z0-9_$]+)*'
+
+# A comma with whitespace around it, which translated argument lists lose.
+SPACED_COMMA_EXPRESSION = '\\s,|,\\s'
+
+
+def trie_expression(words):
+    """
+    Returns a regular expression matching any of the given words, with common
+    prefixes factored out so that the regular expression engine doesn't try
+    every word in turn.
+    """
+
+    trie = dict()
+    for word in words:
+        node = trie
+        for character in word:
+            node = node.setdefault(character, dict())
+        node[''] = None
+
+    def expression(node):
+        optional = '' in node
+        branches = [re.escape(character) + expression(child)
+                    for character, child in sorted(node.items()) if character]
+
+        if not branches:
+            return ''
+
+        if len(branches) == 1 and not optional:
+            return branches[0]
+
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    return expression(trie)
+
+
+class ClassNameScanner():
+    """
+    Finds the obfuscated class names of a class map anywhere in a line.
+
+    Every dotted identifier in the line starting like a class name is found in
+    a single pass of a regular expression, and its longest dot separated
+    prefix that is a known obfuscated class name is looked up in the class
+    map. Names therefore only match on identifier boundaries: "a.b" matches in "a.b" and "a.b.c()", but
+    not in "xa.b" or "a.bc".
+    """
+
+    def __init__(self, class_map):
+        self.class_map = class_map
+
+        # Only identifiers starting with the first part of a class name are
+        # worth looking up.
+        first_parts = set(name.split('.', 1)[0] for name in class_map)
+        expression = IDENTIFIER_PATH_EXPRESSION % (trie_expression(first_parts) or '(?!)')
+
+        self.expression = re.compile(expression)
+        self.bytes_expression = re.compile(expression.encode('utf-8'))
+
+    def find(self, line):
+        """
+        Yields the start index, end index and obfuscated class name of every
+        known class name in the line, which may be text or bytes.
+        """
+
+        class_map = self.class_map
+        binary = isinstance(line, bytes)
+
+        for match in (self.bytes_expression if binary else self.expression).finditer(line):
+            # Identifiers are plain ASCII.
+            token = match.group().decode('ascii') if binary else match.group()
+
+            # Look for the longest prefix that's a class name.
+            end_index = len(token)
+            while end_index > 0 and token[:end_index] not in class_map:
+                end_index = token.rfind('.', 0, end_index)
+
+            if end_index > 0:
+                yield match.start(), match.start() + end_index, token[:end_index]
+
+    def replace(self, line, simple_name=False):
+        """
+        Returns the line with all known obfuscated class names replaced by
+        their original names.
+        """
+
+        pieces = []
+        line_index = 0
+        binary = isinstance(line, bytes)
+
+        for start_index, end_index, obfuscated_class_name in self.find(line):
+            original_class_name = self.class_map[obfuscated_class_name]
+            if simple_name:
+                original_class_name = original_class_name[original_class_name.rfind('.') + 1:]
+            if binary:
+                original_class_name = original_class_name.encode('utf-8')
+
+            pieces.append(line[line_index: start_index])
+            pieces.append(original_class_name)
+            line_index = end_index
+
+        if not pieces:
+            return line
+
+        pieces.append(line[line_index:])
+        return line[:0].join(pieces)
+
+    def contains(self, line):
+        """
+        Returns whether the line contains any known obfuscated class name.
+        """
+
+        for _ in self.find(line):
+            return True
+
+        return False
+
+
+class LinePrefilter():
+    """
+    Cheaply tells whether deobfuscating a line could change it, that is
+    whether it contains any known obfuscated class name, and counts the lines
+    it lets through or skips. With slash_names, class names may also be
+    written with slashes, e.g. "a/b/c". With arguments, argument lists are
+    translated, which drops the whitespace around their commas.
+
+    Lines matching the regular expression come out stripped, whether
+    anything in them is translated or not, so lines starting or ending with
+    whitespace are always let through.
+    """
+
+    def __init__(self, class_map, slash_names=False, arguments=False):
+        self.scanner = ClassNameScanner(class_map)
+        self.slash_names = slash_names
+
+        self.spaced_comma_expression = None
+        self.bytes_spaced_comma_expression = None
+        if arguments:
+            self.spaced_comma_expression = re.compile(SPACED_COMMA_EXPRESSION)
+            self.bytes_spaced_comma_expression = re.compile(SPACED_COMMA_EXPRESSION.encode('utf-8'))
+
+        self.checked = 0
+        self.skipped = 0
+
+    def accepts(self, line):
+        self.checked += 1
+
+        if line[:1].isspace() or line[-1:].isspace():
+            return True
+
+        if self.spaced_comma_expression is not None:
+            binary = isinstance(line, bytes)
+            if (self.bytes_spaced_comma_expression if binary else self.spaced_comma_expression).search(line):
+                return True
+
+        if self.slash_names:
+            line = line.replace(b'/', b'.') if isinstance(line, bytes) else line.replace('/', '.')
+
+        if self.scanner.contains(line):
+            return True
+
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'skip_rate': float(self.skipped) / self.checked if self.checked else 0.0,
+        }
@@ -0,0 +1,212 @@
+"""
+A long running deobfuscation server, keeping mappings loaded between requests.
+
+Requests and responses are JSON objects, one per line. A request names the
+build whose mapping should be used and holds the trace text:
+
+    {"id": 1, "build": "1.2.3", "trace": "java.lang.RuntimeException\\n\\tat a.a.a(SourceFile:15)"}
+
+and is answered, in request order on each connection, with either
+
+    {"id": 1, "trace": "java.lang.RuntimeException\\nat com.example.Foo.run(SourceFile:15)"}
+    {"id": 1, "error": "..."}
+
+Requests are deobfuscated in a thread pool, so the event loop only does I/O.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pyretrace import STACK_TRACE_EXPRESSION
+from pyretrace.reader import MappingError
+from pyretrace.store import MappingStore
+
+
+BUILD_ID_EXPRESSION = re.compile('^[A-Za-z0-9_][A-Za-z0-9_.-]*$')
+
+# Longest request line accepted, in bytes.
+MAX_REQUEST_SIZE = 64 << 20
+
+
+def mapping_resolver(mapping_dir):
+    """
+    Returns a function mapping build ids to mapping files in the given
+    directory: either <build id>.txt or <build id>/mapping.txt.
+    """
+
+    def resolve(build_id):
+        if not BUILD_ID_EXPRESSION.match(build_id):
+            raise ValueError('Invalid build id %r' % build_id)
+
+        mapping_file = os.path.join(mapping_dir, build_id + '.txt')
+        if not os.path.isfile(mapping_file):
+            mapping_file = os.path.join(mapping_dir, build_id, 'mapping.txt')
+
+        if not os.path.isfile(mapping_file):
+            raise ValueError('No mapping for build %r' % build_id)
+
+        return mapping_file
+
+    return resolve
+
+
+class RetraceServer():
+    """
+    Serves deobfuscation requests for the builds of a MappingStore.
+    At most max_concurrency requests are deobfuscated at once, across all
+    connections; pipelined requests beyond that wait their turn.
+    """
+
+    def __init__(self, store, max_concurrency=4):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_concurrency)
+        self.semaphore = None
+
+    def deobfuscate(self, build_id, trace):
+        retrace = self.store.get(build_id)
+        return '\n'.join(retrace.deobfuscate_many(trace.splitlines()))
+
+    async def handle_request(self, line):
+        request_id = None
+
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            build_id = request['build']
+            trace = request['trace']
+
+            async with self.semaphore:
+                loop = asyncio.get_running_loop()
+                output = await loop.run_in_executor(self.executor, self.deobfuscate, build_id, trace)
+
+            return {'id': request_id, 'trace': output}
+        except Exception as ex:
+            return {'id': request_id, 'error': '%s: %s' % (type(ex).__name__, ex)}
+
+    async def write_responses(self, responses, writer):
+        while True:
+            response = await responses.get()
+            if response is None:
+                break
+
+            writer.write(json.dumps(await response).encode('utf-8') + b'\n')
+            await writer.drain()
+
+    @staticmethod
+    async def queue_response(responses, response, responder):
+        """
+        Queues a response for the responder, returning False instead if the
+        responder is done, e.g. as the client reset the connection, and will
+        never make room for it.
+        """
+
+        put = asyncio.ensure_future(responses.put(response))
+        await asyncio.wait([put, responder], return_when=asyncio.FIRST_COMPLETED)
+
+        if not put.done():
+            put.cancel()
+            return False
+
+        return True
+
+    async def handle_connection(self, reader, writer):
+        # Requests are handled concurrently, but answered in order.
+        responses = asyncio.Queue(self.max_concurrency * 4)
+        responder = asyncio.ensure_future(self.write_responses(responses, writer))
+
+        try:
+            while not responder.done():
+                line = await reader.readline()
+                if not line:
+                    break
+
+                if line.strip():
+                    response = asyncio.ensure_future(self.handle_request(line))
+                    if not await self.queue_response(responses, response, responder):
+                        response.cancel()
+                        break
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            await self.queue_response(responses, None, responder)
+
+            try:
+                await responder
+            except ConnectionError:
+                pass
+
+            # Requests that won't be answered anymore.
+            while not responses.empty():
+                response = responses.get_nowait()
+                if response is not None:
+                    response.cancel()
+
+            writer.close()
+
+    async def serve(self, host=None, port=None, socket_path=None):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle_connection, socket_path, limit=MAX_REQUEST_SIZE)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_REQUEST_SIZE)
+
+        async with server:
+            await server.serve_forever()
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='pyretrace serve', description='Serve deobfuscation requests')
+    parser.add_argument("--mapping-dir", "-d", dest="mapping_dir", required=True,
+                        help="directory holding <build id>.txt or <build id>/mapping.txt mapping files")
+    parser.add_argument("--host", dest="host", default='127.0.0.1',
+                        help="address to listen on")
+    parser.add_argument("--port", "-p", type=int, dest="port", default=8765,
+                        help="TCP port to listen on")
+    parser.add_argument("--socket", dest="socket_path", default=None,
+                        help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--concurrency", "-c", type=int, dest="concurrency", default=4,
+                        help="number of requests deobfuscated at once")
+    parser.add_argument("--max-mappings", type=int, dest="max_mappings", default=16,
+                        help="number of mappings kept loaded")
+    parser.add_argument("--preload", dest="preload", action="append", default=[],
+                        help="build id to load on startup. Can be given more than once")
+    parser.add_argument("--lazy", action="store_true", dest="lazy", default=False,
+                        help="only read the members of the classes that show up in stack traces")
+    parser.add_argument("--delta", action="store_true", dest="delta", default=False,
+                        help="load each build as a delta against the most recently used one, sharing unchanged classes")
+    parser.add_argument("--regex", "-r", dest="regex", default=STACK_TRACE_EXPRESSION,
+                        help="regex to match upon")
+    parser.add_argument("--verbose", "-v", action="store_true", dest="verbose", default=False,
+                        help="print verbose log")
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+
+    store = MappingStore(mapping_resolver(options.mapping_dir), max_entries=options.max_mappings, delta=options.delta,
+                         verbose=options.verbose, regular_expression=options.regex, lazy=options.lazy)
+    for build_id in options.preload:
+        try:
+            store.get(build_id)
+        except MappingError as ex:
+            print(ex)
+            sys.exit(1)
+
+    server = RetraceServer(store, options.concurrency)
+
+    try:
+        asyncio.run(server.serve(options.host, options.port, options.socket_path))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,655 @@
+"""
+Read-only mapping tables in a flat binary layout, that many processes can map
+and deobfuscate against without each building its own dictionaries.
+
+The tables are written once to a file, preferably in a memory backed file
+system such as /dev/shm, and mapped by each worker:
+
+    tables = SharedMappingTables.create(Retrace(mapping_file), path='/dev/shm/build-1.2.3')
+
+    # In each worker.
+    retrace = Retrace(None, shared_tables='/dev/shm/build-1.2.3')
+
+All names are kept in a single string table, found through a hash table of
+its entries, and everything else refers to them by index:
+
+    header
+    string offsets     uint32[strings + 1]
+    string bytes       UTF-8, concatenated
+    string hash table  uint32[hash size], string index + 1, or 0 if empty
+    original classes   uint32[strings], original class name of an obfuscated one
+    member records     uint32[strings], member record of an original class name
+    class keys         uint32[classes], the obfuscated class names, in order
+    records            uint32[4 * records], field group range, method group range
+    field groups       uint32[3 * field groups], obfuscated name, field range
+    fields             uint32[2 * fields], type, original name
+    method groups      uint32[5 * method groups], obfuscated name, method range, segment range
+    methods            uint32[5 * methods], first line, last line, type, arguments, original name
+    segment starts     uint32[segments], first line number of each segment
+    segment ranges     uint32[2 * segments], range of the segment's methods
+    segment methods    uint32[segment methods], methods covering each segment
+
+The groups of each record are sorted by obfuscated name index, so that a
+name is found with a binary search. The line numbers of each method group
+are split into segments, as by a MethodSet, so that the methods covering a
+line number are found with a binary search as well.
+
+Integers are native uint32s; tables are only shared between processes of the
+same machine.
+"""
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+from zlib import crc32
+
+from pyretrace import FieldInfo, MethodInfo, MethodSet, line_segments
+
+
+SHARED_MAGIC = b'PYRTSHM\x00'
+SHARED_FORMAT_VERSION = 2
+
+# Written natively, so that tables of another byte order are told apart.
+BYTE_ORDER_MARK = 0x01020304
+
+# Magic, then the version, byte order mark and the size of each section.
+HEADER_FORMAT = '=8s13I'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# No string, record or original class.
+NONE = 0xFFFFFFFF
+
+# The largest line number that can be stored.
+MAX_LINE_NUMBER = 0xFFFFFFFF
+
+# The number of integers in a field and a method group.
+FIELD_GROUP_SIZE = 3
+METHOD_GROUP_SIZE = 5
+
+STRING_ENCODING = 'utf-8'
+
+
+def uint32_array(values=()):
+    table = array('I', values)
+    assert table.itemsize == 4
+    return table
+
+
+class StringTable():
+    """
+    Assigns consecutive indices to strings, as they're added.
+    """
+
+    def __init__(self):
+        self.indices = dict()
+        self.strings = []
+
+    def __len__(self):
+        return len(self.strings)
+
+    def add(self, string):
+        index = self.indices.get(string)
+        if index is None:
+            index = self.indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+
+def compile_tables(class_map, class_field_map, class_method_map):
+    """
+    Returns the flat layout of the given class map and field and method maps,
+    as found in a loaded Retrace.
+    """
+
+    strings = StringTable()
+
+    # Obfuscated class name -> original class name.
+    class_keys = uint32_array(strings.add(name) for name in class_map)
+    class_values = uint32_array(strings.add(name) for name in class_map.values())
+
+    # Original class name -> obfuscated member names -> members, flattened
+    # into consecutive groups of consecutive members.
+    member_classes = list(class_field_map)
+    member_classes.extend(class_name for class_name in class_method_map if class_name not in class_field_map)
+
+    records = uint32_array()
+    field_groups = uint32_array()
+    fields = uint32_array()
+    method_groups = uint32_array()
+    methods = uint32_array()
+    segment_starts = uint32_array()
+    segment_ranges = uint32_array()
+    segment_methods = uint32_array()
+
+    for class_name in member_classes:
+        records.append(len(field_groups) // FIELD_GROUP_SIZE)
+        for name_index, field_set in sorted_groups(strings, class_field_map.get(class_name)):
+            field_groups.append(name_index)
+            field_groups.append(len(fields) // 2)
+            for field_info in field_set:
+                fields.append(strings.add(field_info.type))
+                fields.append(strings.add(field_info.original_name))
+            field_groups.append(len(fields) // 2)
+        records.append(len(field_groups) // FIELD_GROUP_SIZE)
+
+        records.append(len(method_groups) // METHOD_GROUP_SIZE)
+        for name_index, method_set in sorted_groups(strings, class_method_map.get(class_name)):
+            method_set = list(method_set)
+            first_method = len(methods) // 5
+
+            method_groups.append(name_index)
+            method_groups.append(first_method)
+            for method_info in method_set:
+                methods.append(method_info.first_line_number)
+                methods.append(method_info.last_line_number)
+                methods.append(strings.add(method_info.type))
+                methods.append(strings.add(method_info.arguments))
+                methods.append(strings.add(method_info.original_name))
+            method_groups.append(len(methods) // 5)
+
+            method_groups.append(len(segment_starts))
+            boundaries, segments = line_segments(method_set)
+            for boundary, segment in zip(boundaries, segments):
+                # Methods ending at the largest line number cover any line past it.
+                if boundary > MAX_LINE_NUMBER:
+                    break
+
+                segment_starts.append(boundary)
+                segment_ranges.append(len(segment_methods))
+                segment_methods.extend(first_method + index for index in segment)
+                segment_ranges.append(len(segment_methods))
+            method_groups.append(len(segment_starts))
+        records.append(len(method_groups) // METHOD_GROUP_SIZE)
+
+    member_class_indices = [strings.add(class_name) for class_name in member_classes]
+
+    # The string table, and its hash table, with linear probing.
+    encoded = [string.encode(STRING_ENCODING) for string in strings.strings]
+
+    offsets = uint32_array([0])
+    offset = 0
+    for data in encoded:
+        offset += len(data)
+        offsets.append(offset)
+    string_bytes = b''.join(encoded)
+
+    hash_size = 2
+    while hash_size < 2 * len(encoded):
+        hash_size <<= 1
+    mask = hash_size - 1
+
+    hash_table = uint32_array(bytes(4 * hash_size))
+    for index, data in enumerate(encoded):
+        slot = crc32(data) & mask
+        while hash_table[slot]:
+            slot = (slot + 1) & mask
+        hash_table[slot] = index + 1
+
+    original_classes = uint32_array([NONE]) * len(strings)
+    for key, value in zip(class_keys, class_values):
+        original_classes[key] = value
+
+    member_records = uint32_array([NONE]) * len(strings)
+    for record, index in enumerate(member_class_indices):
+        member_records[index] = record
+
+    header = struct.pack(HEADER_FORMAT, SHARED_MAGIC, SHARED_FORMAT_VERSION, BYTE_ORDER_MARK,
+                         len(strings), len(string_bytes), hash_size, len(class_keys), len(member_classes),
+                         len(field_groups) // FIELD_GROUP_SIZE, len(fields) // 2,
+                         len(method_groups) // METHOD_GROUP_SIZE, len(methods) // 5,
+                         len(segment_starts), len(segment_methods))
+
+    # Keep the integer sections aligned after the string bytes.
+    padding = b'\x00' * (-len(string_bytes) % 4)
+
+    return b''.join([header, offsets.tobytes(), string_bytes, padding, hash_table.tobytes(),
+                     original_classes.tobytes(), member_records.tobytes(), class_keys.tobytes(),
+                     records.tobytes(), field_groups.tobytes(), fields.tobytes(),
+                     method_groups.tobytes(), methods.tobytes(),
+                     segment_starts.tobytes(), segment_ranges.tobytes(), segment_methods.tobytes()])
+
+
+def sorted_groups(strings, member_map):
+    """
+    Returns the (obfuscated name index, fields or methods) pairs of the given
+    obfuscated name -> fields or methods map, sorted by name index.
+    """
+
+    if not member_map:
+        return []
+
+    return sorted(((strings.add(obfuscated_name), member_set) for obfuscated_name, member_set in member_map.items()),
+                  key=lambda group: group[0])
+
+
+class SharedMappingTables():
+    """
+    The mapping tables of a flat layout in a buffer, e.g. an mmap of a file in
+    /dev/shm, read in place. class_map, class_field_map and class_method_map
+    look up names like the dictionaries of a Retrace, only decoding the names
+    they return. The layout starts at the given offset of the buffer.
+    """
+
+    def __init__(self, buffer, path=None, offset=0):
+        self.buffer = buffer
+        self.path = path
+        self.offset = offset
+
+        view = self.view = memoryview(buffer)
+        if len(view) < offset + HEADER_SIZE:
+            raise ValueError('Not a pyretrace mapping table')
+
+        (magic, version, byte_order_mark, string_count, string_size, hash_size, class_count, record_count,
+         field_group_count, field_count, method_group_count, method_count, segment_count, segment_method_count) = \
+            struct.unpack_from(HEADER_FORMAT, view, offset)
+
+        if magic != SHARED_MAGIC or version != SHARED_FORMAT_VERSION or byte_order_mark != BYTE_ORDER_MARK:
+            raise ValueError('Not a pyretrace mapping table, or one of another version or machine')
+
+        self.string_count = string_count
+        self.class_count = class_count
+        self.hash_mask = hash_size - 1
+
+        offset += HEADER_SIZE
+
+        def section(size):
+            nonlocal offset
+            start = offset
+            offset += size
+            return view[start: offset]
+
+        self.string_offsets = section(4 * (string_count + 1)).cast('I')
+        self.string_bytes = section(string_size)
+        offset += -string_size % 4
+        self.hash_table = section(4 * hash_size).cast('I')
+        self.original_classes = section(4 * string_count).cast('I')
+        self.member_records = section(4 * string_count).cast('I')
+        self.class_keys = section(4 * class_count).cast('I')
+        self.records = section(4 * 4 * record_count).cast('I')
+        self.field_groups = section(4 * FIELD_GROUP_SIZE * field_group_count).cast('I')
+        self.fields = section(4 * 2 * field_count).cast('I')
+        self.method_groups = section(4 * METHOD_GROUP_SIZE * method_group_count).cast('I')
+        self.methods = section(4 * 5 * method_count).cast('I')
+        self.segment_starts = section(4 * segment_count).cast('I')
+        self.segment_ranges = section(4 * 2 * segment_count).cast('I')
+        self.segment_methods = section(4 * segment_method_count).cast('I')
+
+        if offset > len(view):
+            raise ValueError('Truncated pyretrace mapping table')
+
+    # The views refer to the tables, but not the other way around.
+    @property
+    def class_map(self):
+        return SharedClassMap(self)
+
+    @property
+    def class_field_map(self):
+        return SharedMemberMap(self, FIELD_GROUPS)
+
+    @property
+    def class_method_map(self):
+        return SharedMemberMap(self, METHOD_GROUPS)
+
+    def memoized_maps(self):
+        """
+        Returns class, field and method maps that keep what they've decoded:
+        names, and whole classes in the dictionaries a Retrace builds, so
+        classes looked up again cost as much as in a parsed Retrace.
+        """
+
+        return (SharedClassMap(self, memoize=True),
+                SharedMemberMap(self, FIELD_GROUPS, memoize=True),
+                SharedMemberMap(self, METHOD_GROUPS, memoize=True))
+
+    def __reduce__(self):
+        # Other processes map the same file rather than copying the tables.
+        if self.path is not None:
+            return SharedMappingTables.open, (self.path, self.offset)
+        return SharedMappingTables, (bytes(self.buffer), None, self.offset)
+
+    @classmethod
+    def create(cls, retrace, path):
+        """
+        Writes the tables of a loaded Retrace to the given file, and maps them.
+        """
+
+        data = compile_tables(retrace.class_map, retrace.class_field_map, retrace.class_method_map)
+        directory = os.path.dirname(os.path.abspath(path))
+
+        # Workers opening it while it's being written only see whole tables.
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as writer:
+                writer.write(data)
+
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path, offset=0):
+        """
+        Maps the tables written to the given file, from the given offset.
+        """
+
+        with open(path, 'rb') as reader:
+            buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(buffer, path=path, offset=offset)
+
+    def close(self):
+        """
+        Unmaps the tables. Names returned by lookups stay valid.
+        """
+
+        for attribute in ('string_offsets', 'string_bytes', 'hash_table', 'original_classes', 'member_records',
+                          'class_keys', 'records', 'field_groups', 'fields', 'method_groups', 'methods',
+                          'segment_starts', 'segment_ranges', 'segment_methods', 'view'):
+            getattr(self, attribute).release()
+
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def string(self, index):
+        offsets = self.string_offsets
+        return str(self.string_bytes[offsets[index]: offsets[index + 1]], STRING_ENCODING)
+
+    def string_index(self, string):
+        """
+        Returns the index of the given string in the string table, or None.
+        """
+
+        try:
+            data = string.encode(STRING_ENCODING)
+        except UnicodeEncodeError:
+            # Undecodable input bytes never name anything.
+            return None
+
+        hash_table = self.hash_table
+        offsets = self.string_offsets
+        string_bytes = self.string_bytes
+        mask = self.hash_mask
+
+        slot = crc32(data) & mask
+        while True:
+            entry = hash_table[slot]
+            if not entry:
+                return None
+
+            if string_bytes[offsets[entry - 1]: offsets[entry]] == data:
+                return entry - 1
+
+            slot = (slot + 1) & mask
+
+
+# The offsets of the group ranges in a member record.
+FIELD_GROUPS = 0
+METHOD_GROUPS = 2
+
+
+class SharedClassMap():
+    """
+    Obfuscated class name -> original class name.
+    """
+
+    def __init__(self, tables, memoize=False):
+        self.tables = tables
+
+        # Obfuscated class name -> original class name, of the names found.
+        self.memo = dict() if memoize else None
+
+    def __len__(self):
+        return self.tables.class_count
+
+    def __iter__(self):
+        string = self.tables.string
+        for index in self.tables.class_keys:
+            yield string(index)
+
+    def __contains__(self, obfuscated_class_name):
+        return self.get(obfuscated_class_name) is not None
+
+    def __getitem__(self, obfuscated_class_name):
+        original_class_name = self.get(obfuscated_class_name)
+        if original_class_name is None:
+            raise KeyError(obfuscated_class_name)
+        return original_class_name
+
+    def get(self, obfuscated_class_name, default=None):
+        memo = self.memo
+        if memo is not None:
+            original_class_name = memo.get(obfuscated_class_name)
+            if original_class_name is not None:
+                return original_class_name
+
+        tables = self.tables
+
+        index = tables.string_index(obfuscated_class_name)
+        if index is None:
+            return default
+
+        original_index = tables.original_classes[index]
+        if original_index == NONE:
+            return default
+
+        original_class_name = tables.string(original_index)
+        if memo is not None:
+            memo[obfuscated_class_name] = original_class_name
+
+        return original_class_name
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        tables = self.tables
+        for index in tables.class_keys:
+            yield tables.string(tables.original_classes[index])
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+
+class SharedMemberMap():
+    """
+    Original class name -> obfuscated field or method names, for the classes
+    with any fields or methods.
+    """
+
+    def __init__(self, tables, kind, memoize=False):
+        self.tables = tables
+        self.kind = kind
+
+        # Original class name -> obfuscated name -> fields or methods, of the
+        # classes found.
+        self.memo = dict() if memoize else None
+
+        # String index -> string, of the strings decoded for them.
+        self.strings = dict()
+
+    def __iter__(self):
+        tables = self.tables
+        for index in range(tables.string_count):
+            record = tables.member_records[index]
+            if record != NONE and self.group_range(record)[0] != self.group_range(record)[1]:
+                yield tables.string(index)
+
+    def __contains__(self, class_name):
+        return self.get(class_name) is not None
+
+    def group_range(self, record):
+        records = self.tables.records
+        return records[4 * record + self.kind], records[4 * record + self.kind + 1]
+
+    def get(self, class_name, default=None):
+        memo = self.memo
+        if memo is not None:
+            member_map = memo.get(class_name)
+            if member_map is not None:
+                return member_map
+
+        tables = self.tables
+
+        index = tables.string_index(class_name)
+        if index is None:
+            return default
+
+        record = tables.member_records[index]
+        if record == NONE:
+            return default
+
+        start, end = self.group_range(record)
+        if start == end:
+            return default
+
+        if memo is not None:
+            member_map = memo[class_name] = self.decode(start, end)
+            return member_map
+
+        if self.kind == FIELD_GROUPS:
+            return SharedNameMap(tables, tables.field_groups, FIELD_GROUP_SIZE, start, end, shared_field_set)
+        else:
+            return SharedNameMap(tables, tables.method_groups, METHOD_GROUP_SIZE, start, end, SharedMethodSet)
+
+    def decode(self, start, end):
+        """
+        Returns the fields or methods in the given groups of a class, in the
+        dictionary a Retrace would have for it.
+        """
+
+        tables = self.tables
+        strings = self.strings
+
+        def string(index):
+            # Types and names repeat across classes; decode each one once.
+            value = strings.get(index)
+            if value is None:
+                value = strings[index] = tables.string(index)
+            return value
+
+        member_map = dict()
+        if self.kind == FIELD_GROUPS:
+            groups = tables.field_groups
+            fields = tables.fields
+            for group in range(start, end):
+                name, first, last = groups[FIELD_GROUP_SIZE * group:FIELD_GROUP_SIZE * group + 3]
+                member_map[string(name)] = [FieldInfo(string(fields[2 * index]), string(fields[2 * index + 1]))
+                                            for index in range(first, last)]
+        else:
+            groups = tables.method_groups
+            methods = tables.methods
+            for group in range(start, end):
+                name, first, last = groups[METHOD_GROUP_SIZE * group:METHOD_GROUP_SIZE * group + 3]
+                method_set = MethodSet()
+                for index in range(5 * first, 5 * last, 5):
+                    method_set.add(MethodInfo(methods[index],
+                                              methods[index + 1],
+                                              string(methods[index + 2]),
+                                              string(methods[index + 3]),
+                                              string(methods[index + 4])))
+                member_map[string(name)] = method_set
+
+        return member_map
+
+
+class SharedNameMap():
+    """
+    Obfuscated field or method name -> fields or methods, of a class.
+    """
+
+    def __init__(self, tables, groups, group_size, start, end, member_set):
+        self.tables = tables
+        self.groups = groups
+        self.group_size = group_size
+        self.start = start
+        self.end = end
+        self.member_set = member_set
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        groups = self.groups
+        for group in range(self.start, self.end):
+            yield self.tables.string(groups[self.group_size * group])
+
+    def __contains__(self, obfuscated_name):
+        return self.get(obfuscated_name) is not None
+
+    def get(self, obfuscated_name, default=None):
+        tables = self.tables
+        groups = self.groups
+        group_size = self.group_size
+
+        index = tables.string_index(obfuscated_name)
+        if index is None:
+            return default
+
+        # The groups are sorted by name index.
+        low = self.start
+        high = self.end
+        while low < high:
+            middle = (low + high) // 2
+            if groups[group_size * middle] < index:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self.end or groups[group_size * low] != index:
+            return default
+
+        return self.member_set(tables, groups[group_size * low + 1:group_size * low + group_size])
+
+    def items(self):
+        for obfuscated_name in self:
+            yield obfuscated_name, self.get(obfuscated_name)
+
+
+def shared_field_set(tables, group):
+    start, end = group
+    fields = tables.fields
+    string = tables.string
+    return [FieldInfo(string(fields[2 * index]), string(fields[2 * index + 1])) for index in range(start, end)]
+
+
+class SharedMethodSet():
+    """
+    The methods of a class that share an obfuscated name, like a MethodSet.
+    """
+
+    def __init__(self, tables, group):
+        self.tables = tables
+        self.start, self.end, self.segment_start, self.segment_end = group
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        return iter(self.method_infos(range(self.start, self.end)))
+
+    def method_infos(self, indices):
+        methods = self.tables.methods
+        string = self.tables.string
+        return [MethodInfo(methods[5 * index],
+                           methods[5 * index + 1],
+                           string(methods[5 * index + 2]),
+                           string(methods[5 * index + 3]),
+                           string(methods[5 * index + 4])) for index in indices]
+
+    def candidates(self, line_number):
+        """
+        Returns the methods that may match the given line number, in order.
+        """
+
+        if line_number == 0:
+            return self.method_infos(range(self.start, self.end))
+
+        tables = self.tables
+        segment = bisect_right(tables.segment_starts, line_number, self.segment_start, self.segment_end) - 1
+        return self.method_infos(tables.segment_methods[tables.segment_ranges[2 * segment]:
+                                                        tables.segment_ranges[2 * segment + 1]])
@@ -0,0 +1,187 @@
+"""
+Optional counters and stage timings of a Retrace. Nothing here runs unless
+a Retrace is created with stats enabled: it then wraps its own per-line
+methods and regular expressions, instead of checking a flag on every line.
+"""
+import contextlib
+from time import perf_counter
+
+
+@contextlib.contextmanager
+def timed(stats, stage):
+    """
+    Adds the time the block takes to the given stage of the stats, if any.
+    """
+
+    if stats is None:
+        yield
+        return
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(stage, perf_counter() - start)
+
+
+class RetraceStats():
+    """
+    The counters of a Retrace, and the cumulative time spent in each stage,
+    in seconds. Counters are updated without locking, so they're approximate
+    when lines are deobfuscated by many threads at once, and lines
+    deobfuscated by worker processes aren't counted.
+    """
+
+    def __init__(self):
+        # Lines given to deobfuscate(), the ones matched against the regular
+        # expression rather than answered by the line cache or skipped by the
+        # prefilter, and the ones matching it among those.
+        self.lines = 0
+        self.translated = 0
+        self.matched = 0
+        self.scanned = 0
+
+        self.class_misses = 0
+        self.method_lookups = 0
+        self.method_misses = 0
+        self.ambiguous_methods = 0
+
+        self.deobfuscate_time = 0.0
+        self.match_time = 0.0
+        self.scan_time = 0.0
+
+        # Other stages, e.g. loading phases, by name.
+        self.times = dict()
+
+    def add_time(self, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def count_method(self, matches):
+        """
+        Counts a method lookup that found the given number of matching methods.
+        """
+
+        self.method_lookups += 1
+        if matches == 0:
+            self.method_misses += 1
+        elif matches > 1:
+            self.ambiguous_methods += 1
+
+    def snapshot(self):
+        times = dict(self.times)
+        times['deobfuscate'] = self.deobfuscate_time
+        times['match'] = self.match_time
+        times['translate'] = max(0.0, self.deobfuscate_time - self.match_time)
+        times['scan'] = self.scan_time
+
+        return {
+            'lines': self.lines,
+            'matched': self.matched,
+            'unmatched': self.translated - self.matched,
+            'skipped': self.lines - self.translated,
+            'scanned': self.scanned,
+            'class_misses': self.class_misses,
+            'method_lookups': self.method_lookups,
+            'method_misses': self.method_misses,
+            'ambiguous_methods': self.ambiguous_methods,
+            'times': times,
+        }
+
+
+class TimedPattern():
+    """
+    A compiled regular expression whose matches are timed and counted.
+    """
+
+    def __init__(self, pattern, stats):
+        self.pattern = pattern
+        self.stats = stats
+
+    def match(self, line):
+        start = perf_counter()
+        matcher = self.pattern.match(line)
+        self.stats.match_time += perf_counter() - start
+
+        if matcher:
+            self.stats.matched += 1
+
+        return matcher
+
+
+def instrument(retrace, stats):
+    """
+    Replaces the per-line methods and regular expressions of the given
+    Retrace with ones updating the given stats.
+    """
+
+    deobfuscate = retrace.deobfuscate
+    deobfuscate_line = retrace.deobfuscate_line
+    deobfuscate_class_names = retrace.deobfuscate_class_names
+
+    def timed_deobfuscate(line, simple_name):
+        start = perf_counter()
+        output = deobfuscate(line, simple_name)
+        stats.deobfuscate_time += perf_counter() - start
+        stats.lines += 1
+        return output
+
+    def counted_deobfuscate_line(line, simple_name):
+        stats.translated += 1
+        return deobfuscate_line(line, simple_name)
+
+    def timed_deobfuscate_class_names(line, simple_name=False):
+        start = perf_counter()
+        output = deobfuscate_class_names(line, simple_name)
+        stats.scan_time += perf_counter() - start
+        stats.scanned += 1
+        return output
+
+    translate_class_name = retrace.translate_class_name
+    translate_internal_class_name = retrace.translate_internal_class_name
+    original_method_name = retrace.original_method_name
+
+    def counted_translate_class_name(match, simple_name):
+        if match not in retrace.class_map:
+            stats.class_misses += 1
+        return translate_class_name(match, simple_name)
+
+    def counted_translate_internal_class_name(match, simple_name):
+        if match.replace('/', '.') not in retrace.class_map:
+            stats.class_misses += 1
+        return translate_internal_class_name(match, simple_name)
+
+    def counted_original_method_name(class_name, obfuscated_method_name, line_number, type, arguments,
+                                     out_line, extra_outlines):
+        output = original_method_name(class_name, obfuscated_method_name, line_number, type, arguments,
+                                      out_line, extra_outlines)
+        stats.count_method(matching_methods(retrace, class_name, obfuscated_method_name, line_number, type,
+                                            arguments))
+        return output
+
+    retrace.deobfuscate = timed_deobfuscate
+    retrace.deobfuscate_line = counted_deobfuscate_line
+    retrace.deobfuscate_class_names = timed_deobfuscate_class_names
+    retrace.translate_class_name = counted_translate_class_name
+    retrace.translate_internal_class_name = counted_translate_internal_class_name
+    retrace.original_method_name = counted_original_method_name
+    retrace.pattern = TimedPattern(retrace.pattern, stats)
+    retrace.bytes_pattern = TimedPattern(retrace.bytes_pattern, stats)
+
+    # The group handlers are bound when the Retrace is created.
+    retrace.template = [retrace.group_handler(expression_type)
+                        for expression_type in retrace.expression_types[:retrace.expression_type_count]]
+
+
+def matching_methods(retrace, class_name, obfuscated_method_name, line_number, type, arguments):
+    """
+    Returns the number of methods of the given Retrace that an obfuscated
+    method name could be deobfuscated to.
+    """
+
+    method_map = retrace.class_method_map.get(class_name)
+    method_set = method_map.get(obfuscated_method_name) if method_map else None
+    if not method_set:
+        return 0
+
+    return sum(1 for method_info in method_set.candidates(line_number)
+               if method_info.matches(line_number, type, arguments))
@@ -0,0 +1,138 @@
+import os
+import threading
+
+from pyretrace import Retrace
+from pyretrace.lru import LRUCache
+
+
+# Rough ratio between the memory a loaded Retrace takes and its mapping file size.
+ESTIMATED_BYTES_PER_MAPPING_BYTE = 8
+
+
+def estimate_retrace_size(retrace):
+    """
+    Returns a rough estimate of the memory used by a loaded Retrace, in bytes.
+    """
+
+    try:
+        return os.path.getsize(retrace.mapping_file) * ESTIMATED_BYTES_PER_MAPPING_BYTE
+    except (OSError, TypeError):
+        return 0
+
+
+class PendingLoad():
+    """
+    A mapping that's being loaded by one thread, and waited for by others.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.retrace = None
+        self.error = None
+
+
+class MappingStore():
+    """
+    Loads Retrace instances for many builds on demand, keeping the most
+    recently used ones in memory.
+
+    resolve maps a build id to its mapping file; by default the build id is
+    the mapping file path. The cache is bounded by max_entries and/or by
+    max_bytes, as estimated by sizeof. Concurrent requests for a build that
+    is being loaded wait for that load instead of parsing the mapping again.
+    With delta, a build is loaded as a delta against the most recently used
+    one, sharing the classes they have in common. Any other keyword arguments
+    are passed on to Retrace.
+    """
+
+    def __init__(self, resolve=None, max_entries=None, max_bytes=None, sizeof=estimate_retrace_size,
+                 delta=False, **retrace_options):
+        self.resolve = resolve
+        self.delta = delta
+        self.retrace_options = retrace_options
+
+        self.cache = LRUCache(max_entries, max_bytes, sizeof if max_bytes is not None else None)
+        self.pending = dict()
+        self.lock = threading.Lock()
+
+        self.loads = 0
+        self.load_failures = 0
+        self.coalesced = 0
+
+    def get(self, build_id):
+        """
+        Returns the Retrace for the given build, loading it if needed.
+        """
+
+        retrace = self.cache.get(build_id)
+        if retrace is not None:
+            return retrace
+
+        with self.lock:
+            # It may have been loaded since we looked.
+            retrace = self.cache.peek(build_id)
+            if retrace is not None:
+                return retrace
+
+            pending = self.pending.get(build_id)
+            if pending is None:
+                pending = PendingLoad()
+                self.pending[build_id] = pending
+                loading = True
+            else:
+                self.coalesced += 1
+                loading = False
+
+        if not loading:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.retrace
+
+        try:
+            pending.retrace = self.load(build_id)
+            self.cache.put(build_id, pending.retrace)
+            return pending.retrace
+        except BaseException as ex:
+            pending.error = ex
+            raise
+        finally:
+            with self.lock:
+                del self.pending[build_id]
+            pending.event.set()
+
+    def load(self, build_id):
+        mapping_file = self.resolve(build_id) if self.resolve else build_id
+
+        options = self.retrace_options
+        if self.delta:
+            options = dict(options, base=self.cache.most_recent())
+
+        try:
+            retrace = Retrace(mapping_file, **options)
+        except Exception:
+            self.load_failures += 1
+            raise
+
+        self.loads += 1
+        return retrace
+
+    def evict(self, build_id):
+        return self.cache.pop(build_id)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        """
+        Returns the store's hit, miss, load and eviction counters.
+        """
+
+        stats = self.cache.stats()
+        weight = stats.pop('weight')
+        stats['bytes'] = weight if self.cache.weigh else None
+        stats['loads'] = self.loads
+        stats['load_failures'] = self.load_failures
+        stats['coalesced'] = self.coalesced
+
+        return stats
@@ -0,0 +1,175 @@
+"""
+Groups lines into whole stack traces, so that the many reports sharing the
+same obfuscated trace are deobfuscated once. Traces may be raw, or logged by
+logcat, each line then starting with its date, process, level and tag.
+"""
+import hashlib
+import re
+
+from pyretrace.lru import LRUCache
+
+
+# The prefix logcat adds to each line in its threadtime, time and brief
+# formats, if any.
+LOGCAT_PREFIX_EXPRESSION = ('(?:(?:[0-9]{2}-[0-9]{2}\\s+[0-9:.]+\\s+)?'
+                            '(?:[0-9]+\\s+[0-9]+\\s+[VDIWEFAS]\\s+[^:]*|[VDIWEFAS]/[^:]*):\\s)?')
+
+# Lines continuing the stack trace of the line before them.
+FRAME_EXPRESSION = '^' + LOGCAT_PREFIX_EXPRESSION + \
+                   '\\s*(?:at\\s|Caused by:|Suppressed:|\\.\\.\\.\\s*[0-9]+\\s+more)'
+
+# The numbers of a logcat prefix: its date, time and process and thread ids.
+NUMBER_EXPRESSION = '[0-9]+'
+
+logcat_prefix_pattern = re.compile(LOGCAT_PREFIX_EXPRESSION)
+bytes_logcat_prefix_pattern = re.compile(LOGCAT_PREFIX_EXPRESSION.encode('ascii'))
+frame_pattern = re.compile(FRAME_EXPRESSION)
+bytes_frame_pattern = re.compile(FRAME_EXPRESSION.encode('ascii'))
+number_pattern = re.compile(NUMBER_EXPRESSION)
+bytes_number_pattern = re.compile(NUMBER_EXPRESSION.encode('ascii'))
+
+
+def split_traces(lines):
+    """
+    Yields lists of lines, each a stack trace: an exception header followed by
+    its "at", "Caused by:", "Suppressed:" and "... n more" lines, with or
+    without a logcat prefix. Other lines are traces of their own, of a single
+    line. Lines may be text or bytes.
+    """
+
+    trace = []
+    for line in lines:
+        if trace and not (bytes_frame_pattern if isinstance(line, bytes) else frame_pattern).match(line):
+            yield trace
+            trace = []
+
+        trace.append(line)
+
+    if trace:
+        yield trace
+
+
+def logcat_prefix_length(line):
+    """
+    Returns the length of the logcat prefix of the given line, or 0.
+    """
+
+    return (bytes_logcat_prefix_pattern if isinstance(line, bytes) else logcat_prefix_pattern).match(line).end()
+
+
+def trace_key(line, prefix_length):
+    """
+    Returns the given line with the numbers of its logcat prefix blanked out,
+    so that the copies of a trace logged at other times or by other
+    processes have the same key.
+    """
+
+    if not prefix_length:
+        return line
+
+    if isinstance(line, bytes):
+        return bytes_number_pattern.sub(b'0', line[:prefix_length]) + line[prefix_length:]
+    else:
+        return number_pattern.sub('0', line[:prefix_length]) + line[prefix_length:]
+
+
+def trace_fingerprint(trace):
+    """
+    Returns a hex digest identifying the given obfuscated stack trace.
+    """
+
+    digest = hashlib.sha1()
+    for line in trace:
+        digest.update(line if isinstance(line, bytes) else line.encode('utf-8', 'surrogateescape'))
+        digest.update(b'\n')
+
+    return digest.hexdigest()
+
+
+class TraceDeduplicator():
+    """
+    Deobfuscates the stack traces in a stream of lines, each distinct one only
+    once. Up to max_traces distinct deobfuscated traces are remembered, or all
+    of them if None. When scanning, class names are deobfuscated anywhere in
+    the lines, instead of where they match the regular expression.
+
+    Traces only differing in the numbers of the logcat prefixes of their
+    lines, such as their times and process ids, are the same trace, as long
+    as deobfuscating it leaves the prefixes as they are. Raw traces and traces
+    with other prefixes are told apart, as the regular expression matches
+    whole lines, prefixes included.
+    """
+
+    def __init__(self, retrace, max_traces=None, scan=False):
+        self.retrace = retrace
+        self.traces = LRUCache(max_entries=max_traces)
+
+        if scan:
+            self.deobfuscate_line = retrace.deobfuscate_class_names
+        else:
+            self.deobfuscate_line = lambda line: retrace.deobfuscate(line, False)
+
+    def deobfuscate_trace(self, trace):
+        """
+        Returns the fingerprint of the given trace, and its deobfuscated lines.
+        """
+
+        prefix_lengths = [logcat_prefix_length(line) for line in trace]
+        fingerprint = trace_fingerprint([trace_key(line, prefix_length)
+                                         for line, prefix_length in zip(trace, prefix_lengths)])
+
+        # The deobfuscated lines, without their logcat prefixes.
+        messages = self.traces.get(fingerprint)
+        if messages is not None:
+            return fingerprint, [line[:prefix_length] + message
+                                 for line, prefix_length, message in zip(trace, prefix_lengths, messages)]
+
+        output = [self.deobfuscate_line(line) for line in trace]
+
+        if all(output_line[:prefix_length] == line[:prefix_length]
+               for line, output_line, prefix_length in zip(trace, output, prefix_lengths)):
+            self.traces.put(fingerprint, [output_line[prefix_length:]
+                                          for output_line, prefix_length in zip(output, prefix_lengths)])
+
+        return fingerprint, output
+
+    def expand(self, lines):
+        """
+        Yields the deobfuscated version of each of the given lines, like
+        Retrace.deobfuscate_iter().
+        """
+
+        for trace in split_traces(lines):
+            for line in self.deobfuscate_trace(trace)[1]:
+                yield line
+
+    def aggregate(self, lines):
+        """
+        Returns a (fingerprint, count, deobfuscated lines) tuple for every
+        distinct trace in the given lines, the most frequent first.
+        """
+
+        aggregates = dict()
+        for trace in split_traces(lines):
+            fingerprint, output = self.deobfuscate_trace(trace)
+
+            aggregate = aggregates.get(fingerprint)
+            if aggregate is None:
+                aggregates[fingerprint] = [fingerprint, 1, output]
+            else:
+                aggregate[1] += 1
+
+        # Ties keep the order the traces first showed up in.
+        return [tuple(aggregate) for aggregate in sorted(aggregates.values(), key=lambda aggregate: -aggregate[1])]
+
+    def stats(self):
+        """
+        Returns the number of traces seen, and how many were deobfuscated.
+        """
+
+        stats = self.traces.stats()
+        return {
+            'traces': stats['hits'] + stats['misses'],
+            'deobfuscated': stats['misses'],
+            'evictions': stats['evictions'],
+        }
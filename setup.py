@@ -13,5 +13,9 @@ setup(
     author_email='rotem@everything.me',
     url='http://github.com/EverythingMe/pyretrace',
     version='0.3',
-    packages=find_packages(),
+    python_requires='>=3.7',
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
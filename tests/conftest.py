@@ -0,0 +1,50 @@
+import pytest
+
+
+MAPPING = """\
+com.example.Foo -> a.a:
+    int count -> a
+    java.lang.String name -> b
+    10:20:void run() -> a
+    21:30:void run(int) -> a
+    31:35:int compute(java.lang.String,int) -> b
+    void helper() -> c
+com.example.Bar -> a.b:
+    com.example.Foo foo -> a
+    5:9:void <init>() -> <init>
+    12:40:void onResume() -> a
+com.example.FooActivity -> a.c:
+    100:120:void onResume() -> a
+    121:130:void onPause() -> b
+"""
+
+TRACE = """\
+java.lang.RuntimeException: boom
+\tat a.a.a(SourceFile:15)
+\tat a.a.a(SourceFile:25)
+\tat a.b.a(SourceFile:13)
+\tat a.c.b(SourceFile:125)
+\tat a.a.c(SourceFile)
+Caused by: a.b: oops
+\tat android.os.Handler.dispatch(Handler.java:95)
+just some log line
+"""
+
+DEOBFUSCATED_TRACE = """\
+java.lang.RuntimeException: boom
+at com.example.Foo.run(SourceFile:15)
+at com.example.Foo.run(SourceFile:25)
+at com.example.Bar.onResume(SourceFile:13)
+at com.example.FooActivity.onPause(SourceFile:125)
+at com.example.Foo.helper(SourceFile)
+Caused by: com.example.Bar: oops
+at android.os.Handler.dispatch(Handler.java:95)
+just some log line
+"""
+
+
+@pytest.fixture
+def mapping_file(tmp_path):
+    path = tmp_path / 'mapping.txt'
+    path.write_text(MAPPING)
+    return str(path)
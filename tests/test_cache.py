@@ -0,0 +1,59 @@
+import os
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from conftest import MAPPING, TRACE
+from pyretrace import Retrace
+from pyretrace.cache import CACHE_SUFFIX, CompiledMappingReader
+
+
+def test_cached_load_matches_parsed_load(tmp_path):
+    mapping_file = generate_mapping(str(tmp_path / 'mapping.txt'), classes=200, unranged=0.2)
+    lines = [line.rstrip('\n') for line in generate_trace_lines(2000, classes=200)]
+    expected = Retrace(mapping_file).deobfuscate_many(lines)
+
+    first = Retrace(mapping_file, use_cache=True)
+    assert first.shared_tables is None
+    assert os.path.exists(mapping_file + CACHE_SUFFIX)
+
+    cached = Retrace(mapping_file, use_cache=True)
+    assert cached.shared_tables is not None
+
+    assert first.deobfuscate_many(lines) == expected
+    assert cached.deobfuscate_many(lines) == expected
+
+    # Classes looked up again come from what the first pass decoded.
+    assert len(cached.class_method_map.memo) > 0
+    assert cached.deobfuscate_many(lines) == expected
+
+
+def test_compiled_copy_in_cache_dir(mapping_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    path = CompiledMappingReader(mapping_file, cache_dir).compile()
+    assert os.path.dirname(path) == cache_dir
+
+    retrace = Retrace(mapping_file, cache_dir=cache_dir)
+    assert retrace.shared_tables is not None
+    assert retrace.deobfuscate_many(TRACE.splitlines()) == Retrace(mapping_file).deobfuscate_many(TRACE.splitlines())
+
+
+def test_touched_mapping_keeps_compiled_copy(mapping_file):
+    CompiledMappingReader(mapping_file).compile()
+
+    status = os.stat(mapping_file)
+    os.utime(mapping_file, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9))
+
+    assert Retrace(mapping_file, use_cache=True).shared_tables is not None
+
+
+def test_changed_mapping_is_parsed_again(mapping_file):
+    CompiledMappingReader(mapping_file).compile()
+
+    with open(mapping_file, 'w') as writer:
+        writer.write(MAPPING.replace('void run() -> a', 'void walk() -> a'))
+
+    retrace = Retrace(mapping_file, use_cache=True)
+    assert retrace.shared_tables is None
+    assert retrace.deobfuscate('\tat a.a.a(SourceFile:15)', False) == 'at com.example.Foo.walk(SourceFile:15)'
+
+    # The compiled copy is written again.
+    assert Retrace(mapping_file, use_cache=True).shared_tables is not None
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from benchmarks.synthetic import generate_mapping, obfuscated_name
+from pyretrace import Retrace
+
+numpy = pytest.importorskip('numpy')
+
+
+def generate_frames(count, classes, seed=0):
+    rng = random.Random(seed)
+
+    # Some classes and methods aren't in the mapping, and some frames have no line number.
+    class_names = ['a.%s' % obfuscated_name(rng.randrange(classes + 10)) for _ in range(count)]
+    method_names = [obfuscated_name(rng.randrange(7)) for _ in range(count)]
+    line_numbers = [rng.choice([0, rng.randint(1, 400)]) for _ in range(count)]
+
+    return class_names, method_names, line_numbers
+
+
+def text_frames(retrace, class_names, method_names, line_numbers, simple_name):
+    lines = ['at %s.%s(SourceFile%s)' % (class_name, method_name, ':%d' % line_number if line_number else '')
+             for class_name, method_name, line_number in zip(class_names, method_names, line_numbers)]
+
+    frames = [line[len('at '):line.index('(')].rsplit('.', 1)
+              for line in retrace.deobfuscate_many(lines, simple_name)]
+    return [frame[0] for frame in frames], [frame[1] for frame in frames]
+
+
+@pytest.mark.parametrize('simple_name', [False, True])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_frames_match_text_lines(tmp_path, simple_name, lazy):
+    mapping_file = generate_mapping(str(tmp_path / 'mapping.txt'), classes=100, unranged=0.2)
+    class_names, method_names, line_numbers = generate_frames(5000, classes=100)
+
+    expected = text_frames(Retrace(mapping_file), class_names, method_names, line_numbers, simple_name)
+
+    retrace = Retrace(mapping_file, lazy=lazy)
+    result = retrace.deobfuscate_frames(numpy.array(class_names), numpy.array(method_names),
+                                        numpy.array(line_numbers), simple_name)
+
+    assert [names.tolist() for names in result] == list(expected)
+
+
+OVERLAPPING_MAPPING = """\
+com.example.Walker -> a.a:
+    void idle() -> a
+    1:20:void run() -> a
+    5:10:void inlined() -> a
+    10:15:void walk(int) -> a
+    25:22:void inverted() -> a
+    void stop() -> b
+"""
+
+
+def test_overlapping_frames_match_text_lines(tmp_path):
+    mapping_file = tmp_path / 'mapping.txt'
+    mapping_file.write_text(OVERLAPPING_MAPPING)
+    retrace = Retrace(str(mapping_file))
+
+    line_numbers = list(range(0, 30))
+    class_names = ['a.a'] * len(line_numbers) * 2
+    method_names = ['a'] * len(line_numbers) + ['b'] * len(line_numbers)
+
+    expected = text_frames(retrace, class_names, method_names, line_numbers * 2, False)
+    result = retrace.deobfuscate_frames(numpy.array(class_names), numpy.array(method_names),
+                                        numpy.array(line_numbers * 2))
+
+    assert [names.tolist() for names in result] == list(expected)
@@ -0,0 +1,75 @@
+import pytest
+
+from conftest import MAPPING, TRACE
+from pyretrace import MappingMaps, Retrace
+from pyretrace.delta import DeltaMappingReader
+
+
+TWICE = """\
+com.example.Twice -> a.d:
+    1:5:void first() -> a
+com.example.Twice -> a.d:
+    6:9:void second() -> b
+"""
+
+# Foo gains a method, Bar and FooActivity are unchanged.
+CHANGED_MAPPING = MAPPING.replace('    void helper() -> c\n', '    void helper() -> c\n    void other() -> d\n')
+
+TWICE_TRACE = '\tat a.d.a(SourceFile:3)\n\tat a.d.b(SourceFile:7)\n'
+
+
+@pytest.fixture
+def mappings(tmp_path):
+    base_file = tmp_path / 'base.txt'
+    base_file.write_text(MAPPING + TWICE)
+    mapping_file = tmp_path / 'mapping.txt'
+    mapping_file.write_text(CHANGED_MAPPING + TWICE)
+    return str(base_file), str(mapping_file)
+
+
+def load_base(base_file, kind):
+    if kind == 'cached':
+        # The first load compiles the copy the second one maps.
+        Retrace(base_file, use_cache=True)
+        base = Retrace(base_file, use_cache=True)
+        assert base.shared_tables is not None
+        return base
+
+    return Retrace(base_file, lazy=(kind == 'lazy'))
+
+
+@pytest.mark.parametrize('kind', ['eager', 'lazy', 'cached'])
+def test_delta_reuses_unchanged_classes(mappings, kind):
+    base_file, mapping_file = mappings
+    base = load_base(base_file, kind)
+    assert base.section_digests is None
+
+    reader = DeltaMappingReader(mapping_file, base)
+    maps = MappingMaps()
+    reader.pump(maps)
+
+    # The base's digests are computed from its mapping file when first needed.
+    assert base.section_digests is not None
+    assert base.section_digests['com.example.Twice'] is None
+    assert maps.section_digests['com.example.Foo'] != base.section_digests['com.example.Foo']
+
+    # Foo changed and Twice has two sections, so both are parsed.
+    assert reader.reused == 2
+    assert reader.parsed == 3
+    assert maps.class_method_map['com.example.Bar'] is base.class_method_map.get('com.example.Bar')
+    assert maps.class_method_map['com.example.Foo'] is not base.class_method_map.get('com.example.Foo')
+    assert 'd' in maps.class_method_map['com.example.Foo']
+    assert sorted(maps.class_method_map['com.example.Twice']) == ['a', 'b']
+
+
+@pytest.mark.parametrize('kind', ['eager', 'lazy', 'cached'])
+def test_delta_matches_full_parse(mappings, kind):
+    base_file, mapping_file = mappings
+    retrace = Retrace(mapping_file, base=load_base(base_file, kind))
+    lines = (TRACE + TWICE_TRACE + '\tat a.a.d(SourceFile)\n').splitlines()
+
+    assert retrace.deobfuscate_many(lines) == Retrace(mapping_file).deobfuscate_many(lines)
+    assert retrace.class_map == Retrace(mapping_file).class_map
+
+    # A Retrace loaded as a delta is itself a base for the next build.
+    assert retrace.section_digests['com.example.Bar'] is not None
@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import DEOBFUSCATED_TRACE, TRACE
+from pyretrace import Retrace
+
+
+AMBIGUOUS_MAPPING = """\
+com.example.Walker -> a.a:
+    int steps -> a
+    long distance -> a
+    1:5:void run() -> b
+    1:5:void walk(int) -> b
+"""
+
+# Alternatives line up with the first name, in the input line before stripping.
+ALTERNATIVE_INDENT = ' ' * len('\tat com.example.Walker.')
+
+
+@pytest.fixture
+def ambiguous_mapping_file(tmp_path):
+    path = tmp_path / 'mapping.txt'
+    path.write_text(AMBIGUOUS_MAPPING)
+    return str(path)
+
+
+def test_deobfuscate_trace(mapping_file):
+    retrace = Retrace(mapping_file)
+    assert retrace.deobfuscate_many(TRACE.splitlines()) == DEOBFUSCATED_TRACE.splitlines()
+
+
+def test_ambiguous_methods_list_alternatives(ambiguous_mapping_file):
+    retrace = Retrace(ambiguous_mapping_file)
+    assert retrace.deobfuscate('\tat a.a.b(SourceFile:3)', False) == \
+        'at com.example.Walker.run(SourceFile:3)\n' + ALTERNATIVE_INDENT + 'walk'
+
+
+def test_ambiguous_methods_list_alternatives_verbosely(ambiguous_mapping_file):
+    retrace = Retrace(ambiguous_mapping_file, verbose=True)
+    assert retrace.deobfuscate('\tat a.a.b(SourceFile:3)', False) == \
+        'at com.example.Walker.void run()(SourceFile:3)\n' + ALTERNATIVE_INDENT + 'void walk(int)'
+
+
+def test_ambiguous_fields_list_alternatives(ambiguous_mapping_file):
+    retrace = Retrace(ambiguous_mapping_file, regular_expression='%c\\.%f')
+    assert retrace.deobfuscate('a.a.a', False) == 'com.example.Walker.steps\n                   distance'
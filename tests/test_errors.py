@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import MAPPING
+from pyretrace import MappingError, Retrace
+from pyretrace.follow import MappingWatcher
+from pyretrace.server import RetraceServer, mapping_resolver
+from pyretrace.store import MappingStore
+
+
+BROKEN_MAPPING = 'com.example.Foo -> a.a:\n    1:x:void run() -> a\n'
+
+
+@pytest.mark.parametrize('options', [{}, {'lazy': True}, {'load_jobs': 2}])
+def test_broken_mapping_raises(tmp_path, capsys, options):
+    mapping_file = tmp_path / 'mapping.txt'
+    mapping_file.write_text(BROKEN_MAPPING)
+
+    with pytest.raises(MappingError):
+        retrace = Retrace(str(mapping_file), **options)
+        retrace.deobfuscate('\tat a.a.a(SourceFile:1)', False)
+
+    assert capsys.readouterr().out == ''
+
+
+def test_server_answers_broken_mapping_with_its_error(tmp_path, capsys):
+    (tmp_path / 'broken.txt').write_text(BROKEN_MAPPING)
+    (tmp_path / 'good.txt').write_text(MAPPING)
+
+    server = RetraceServer(MappingStore(mapping_resolver(str(tmp_path))))
+
+    async def request(build_id):
+        server.semaphore = asyncio.Semaphore(1)
+        return await server.handle_request(json.dumps({'id': 1, 'build': build_id, 'trace': '\tat a.a.a(SourceFile:15)'}))
+
+    response = asyncio.run(request('broken'))
+    assert response['error'].startswith('MappingError: Can\'t process mapping file')
+
+    assert asyncio.run(request('good')) == {'id': 1, 'trace': 'at com.example.Foo.run(SourceFile:15)'}
+    assert capsys.readouterr().out == ''
+
+
+def test_watcher_keeps_mapping_that_fails_to_reload(mapping_file, capsys):
+    watcher = MappingWatcher(mapping_file, log=None)
+    retrace = watcher.retrace
+
+    with open(mapping_file, 'w') as writer:
+        writer.write(BROKEN_MAPPING)
+    watcher.reload()
+
+    assert watcher.retrace is retrace
+    assert watcher.reload_failures == 1
+
+    output = capsys.readouterr()
+    assert output.out == ''
+    assert 'MappingError' in output.err
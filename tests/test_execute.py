@@ -0,0 +1,56 @@
+import os
+import selectors
+import subprocess
+import sys
+
+from conftest import DEOBFUSCATED_TRACE, TRACE
+from pyretrace import Retrace
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_retrace(arguments, **options):
+    return subprocess.Popen([sys.executable, '-c', 'import pyretrace; pyretrace.main()'] + arguments,
+                            cwd=ROOT, stdout=subprocess.PIPE, **options)
+
+
+def test_execute_file(mapping_file, tmp_path):
+    trace_file = tmp_path / 'trace.txt'
+    trace_file.write_text(TRACE)
+
+    output_file = tmp_path / 'output.txt'
+    with open(str(output_file), 'w') as output:
+        Retrace(mapping_file, stacktrace_file=str(trace_file)).execute(output=output)
+
+    assert output_file.read_text() == DEOBFUSCATED_TRACE
+
+
+def test_execute_binary_file(mapping_file, tmp_path):
+    trace_file = tmp_path / 'trace.txt'
+    trace_file.write_text(TRACE)
+
+    output_file = tmp_path / 'output.txt'
+    with open(str(output_file), 'wb') as output:
+        Retrace(mapping_file, stacktrace_file=str(trace_file)).execute(output=output, binary=True)
+
+    assert output_file.read_text() == DEOBFUSCATED_TRACE
+
+
+def test_pipe_is_deobfuscated_as_it_is_written(mapping_file):
+    for arguments in ([], ['--binary']):
+        process = run_retrace(['-m', mapping_file] + arguments, stdin=subprocess.PIPE)
+        try:
+            # Only one line is written, and the pipe is kept open.
+            process.stdin.write(b'\tat a.a.a(SourceFile:15)\n')
+            process.stdin.flush()
+
+            selector = selectors.DefaultSelector()
+            selector.register(process.stdout, selectors.EVENT_READ)
+            assert selector.select(timeout=30), 'no output while the input is still open'
+
+            assert process.stdout.readline() == b'at com.example.Foo.run(SourceFile:15)\n'
+        finally:
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
@@ -0,0 +1,115 @@
+import io
+import os
+import subprocess
+import time
+
+import pytest
+
+from conftest import MAPPING
+from test_execute import run_retrace
+from pyretrace.follow import MappingWatcher, follow, follow_lines
+
+POLL_INTERVAL = 0.01
+
+FRAME = '\tat a.a.c(SourceFile)'
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(POLL_INTERVAL)
+
+
+def take(lines, count):
+    return [next(lines) for _ in range(count)]
+
+
+def test_follow_lines_appended(tmp_path):
+    path = tmp_path / 'log.txt'
+    path.write_text('first\nsecond\n')
+    lines = follow_lines(str(path), POLL_INTERVAL)
+    assert take(lines, 2) == ['first', 'second']
+
+    # An incomplete line is only yielded once the rest of it is written.
+    with open(str(path), 'a') as writer:
+        writer.write('thi')
+        writer.flush()
+        time.sleep(5 * POLL_INTERVAL)
+        writer.write('rd\n')
+    assert take(lines, 1) == ['third']
+    lines.close()
+
+
+def test_follow_lines_truncated(tmp_path):
+    path = tmp_path / 'log.txt'
+    path.write_text('first line\nsecond line\n')
+    lines = follow_lines(str(path), POLL_INTERVAL)
+    assert take(lines, 2) == ['first line', 'second line']
+
+    path.write_text('new\n')
+    assert take(lines, 1) == ['new']
+    lines.close()
+
+
+def test_follow_lines_replaced(tmp_path):
+    path = tmp_path / 'log.txt'
+    path.write_text('first\n')
+    lines = follow_lines(str(path), POLL_INTERVAL)
+    assert take(lines, 1) == ['first']
+
+    # Rotated away and recreated: longer than what was read, but a new file.
+    replacement = tmp_path / 'log.txt.new'
+    replacement.write_text('rotated first\nrotated second\n')
+    os.replace(str(replacement), str(path))
+    assert take(lines, 2) == ['rotated first', 'rotated second']
+    lines.close()
+
+
+@pytest.fixture
+def watcher(mapping_file):
+    watcher = MappingWatcher(mapping_file, POLL_INTERVAL, log=io.StringIO())
+    watcher.start()
+    yield watcher
+    watcher.stop()
+
+
+def test_watcher_swaps_in_changed_mapping(watcher, mapping_file):
+    retrace = watcher.retrace
+    assert retrace.deobfuscate(FRAME, False) == 'at com.example.Foo.helper(SourceFile)'
+
+    with open(mapping_file, 'w') as writer:
+        writer.write(MAPPING.replace('void helper()', 'void assistant()'))
+    wait_for(lambda: watcher.reloads == 1)
+
+    assert watcher.retrace is not retrace
+    assert watcher.retrace.deobfuscate(FRAME, False) == 'at com.example.Foo.assistant(SourceFile)'
+    assert 'Reloaded mapping file' in watcher.log.getvalue()
+
+    # The unchanged classes were reused from the previous mapping.
+    assert watcher.retrace.class_method_map['com.example.Bar'] is retrace.class_method_map['com.example.Bar']
+
+    output = io.StringIO()
+    follow(watcher, iter([FRAME, 'plain']), output)
+    assert output.getvalue() == 'at com.example.Foo.assistant(SourceFile)\nplain\n'
+
+
+def test_watcher_keeps_mapping_that_fails_to_reload(watcher, mapping_file):
+    retrace = watcher.retrace
+
+    with open(mapping_file, 'w') as writer:
+        writer.write(MAPPING.replace('10:20:', '10x:20:'))
+    wait_for(lambda: watcher.reload_failures == 1)
+
+    assert watcher.retrace is retrace
+    assert watcher.reloads == 0
+    assert 'Can\'t reload mapping file' in watcher.log.getvalue()
+
+
+@pytest.mark.parametrize('option', [['--stats'], ['--flush-lines', '10']])
+def test_follow_rejects_options_it_would_ignore(mapping_file, option):
+    process = run_retrace(['--follow', '-m', mapping_file] + option, stderr=subprocess.PIPE)
+    _, error = process.communicate()
+
+    assert process.returncode == 2
+    assert b'--follow can\'t be combined' in error
@@ -0,0 +1,56 @@
+import pytest
+
+from conftest import DEOBFUSCATED_TRACE, TRACE
+from pyretrace import Retrace
+from test_execute import run_retrace
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_cached_lines_match_uncached_lines(mapping_file, binary):
+    lines = TRACE.encode().splitlines() if binary else TRACE.splitlines()
+    expected = Retrace(mapping_file).deobfuscate_many(lines)
+
+    retrace = Retrace(mapping_file, cache_size=100)
+    assert retrace.deobfuscate_many(lines) == expected
+    assert retrace.cache_info()['hits'] == 0
+    assert retrace.cache_info()['misses'] == len(lines)
+
+    assert retrace.deobfuscate_many(lines) == expected
+    assert retrace.cache_info()['hits'] == len(lines)
+    assert retrace.cache_info()['misses'] == len(lines)
+    assert all(type(line) is type(lines[0]) for line in retrace.deobfuscate_many(lines))
+
+
+def test_str_and_bytes_lines_are_cached_apart(mapping_file):
+    retrace = Retrace(mapping_file, cache_size=100)
+    line = '\tat a.a.a(SourceFile:15)'
+
+    assert retrace.deobfuscate(line, False) == 'at com.example.Foo.run(SourceFile:15)'
+    assert retrace.deobfuscate(line.encode(), False) == b'at com.example.Foo.run(SourceFile:15)'
+    assert retrace.deobfuscate(line, True) == Retrace(mapping_file).deobfuscate(line, True)
+    assert retrace.cache_info()['misses'] == 3
+
+
+def test_evicted_lines_are_deobfuscated_again(mapping_file):
+    lines = TRACE.splitlines()
+    retrace = Retrace(mapping_file, cache_size=2)
+
+    assert retrace.deobfuscate_many(lines * 2) == Retrace(mapping_file).deobfuscate_many(lines * 2)
+    assert retrace.cache_info()['hits'] == 0
+    assert retrace.cache_info()['evictions'] == len(lines) * 2 - 2
+
+
+def test_no_cache_by_default(mapping_file):
+    assert Retrace(mapping_file).cache_info() is None
+
+
+@pytest.mark.parametrize('arguments', [[], ['--binary']])
+def test_cache_size_option(mapping_file, tmp_path, arguments):
+    trace_file = tmp_path / 'trace.txt'
+    trace_file.write_text(TRACE * 2)
+
+    process = run_retrace(['-m', mapping_file, '-s', str(trace_file), '--cache-size', '4'] + arguments)
+    output, _ = process.communicate()
+
+    assert process.returncode == 0
+    assert output.decode() == DEOBFUSCATED_TRACE * 2
@@ -0,0 +1,50 @@
+import pytest
+
+from benchmarks.synthetic import class_name, generate_mapping
+from pyretrace import MappingMaps
+from pyretrace.parallel import ParallelMappingReader
+from pyretrace.reader import MappingReader, MappingRecorder
+
+
+def member_tuples(class_member_map):
+    return {class_name: {obfuscated_name: [tuple(getattr(member_info, slot) for slot in member_info.__slots__)
+                                           for member_info in member_set]
+                         for obfuscated_name, member_set in member_map.items()}
+            for class_name, member_map in class_member_map.items()}
+
+
+@pytest.fixture
+def parallel_mapping_file(tmp_path):
+    mapping_file = generate_mapping(str(tmp_path / 'mapping.txt'), classes=200, unranged=0.2)
+
+    # A class mapped again in another chunk, with more members of the same names.
+    with open(mapping_file, 'a') as writer:
+        writer.write('%s -> z.z:\n' % class_name(0))
+        writer.write('    int extra -> a\n')
+        writer.write('    int other -> zz\n')
+        writer.write('    40:50:void extra() -> a\n')
+        writer.write('    void other() -> zz\n')
+
+    return mapping_file
+
+
+def test_parallel_maps_match_sequential_maps(parallel_mapping_file):
+    expected = MappingMaps()
+    MappingReader(parallel_mapping_file).pump(expected)
+
+    maps = MappingMaps()
+    ParallelMappingReader(parallel_mapping_file, 2).pump(maps)
+
+    assert list(maps.class_map.items()) == list(expected.class_map.items())
+    assert member_tuples(maps.class_field_map) == member_tuples(expected.class_field_map)
+    assert member_tuples(maps.class_method_map) == member_tuples(expected.class_method_map)
+
+
+def test_parallel_callbacks_match_sequential_callbacks(parallel_mapping_file):
+    expected = MappingRecorder()
+    MappingReader(parallel_mapping_file).pump(expected)
+
+    recorder = MappingRecorder()
+    ParallelMappingReader(parallel_mapping_file, 2).pump(recorder)
+
+    assert recorder.records == expected.records
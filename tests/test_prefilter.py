@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks.synthetic import generate_logcat_lines, generate_mapping
+from pyretrace import Retrace
+
+
+EXTRA_LINES = [
+    '\tat java.lang.Thread.run(Thread.java:1)',
+    '    at android.os.Handler.dispatch(Handler.java:95)',
+    'java.lang.RuntimeException: boom  ',
+    'Caused by: java.io.IOException: gone',
+    'plain message',
+    '',
+    '   ',
+    'java.util.Map.put(java.lang.Object, java.lang.Object)',
+    '\tat a.a.a(SourceFile:15)',
+]
+
+
+@pytest.fixture(scope='module')
+def logcat(tmp_path_factory):
+    mapping_file = generate_mapping(str(tmp_path_factory.mktemp('prefilter') / 'mapping.txt'), classes=200)
+    lines = [line.rstrip('\n') for line in generate_logcat_lines(2000, classes=200)]
+    return mapping_file, lines + EXTRA_LINES
+
+
+@pytest.mark.parametrize('regular_expression', [None, '%c\\.%m\\(%a\\)', '%C %c'])
+def test_prefilter_keeps_output(logcat, regular_expression):
+    mapping_file, lines = logcat
+    options = {'regular_expression': regular_expression} if regular_expression else {}
+
+    retrace = Retrace(mapping_file, **options)
+    prefiltered = Retrace(mapping_file, prefilter=True, **options)
+
+    assert prefiltered.deobfuscate_many(lines) == retrace.deobfuscate_many(lines)
+
+    binary_lines = [line.encode('utf-8') for line in lines]
+    assert prefiltered.deobfuscate_many(binary_lines) == retrace.deobfuscate_many(binary_lines)
+
+    assert prefiltered.prefilter_info()['skipped'] > 0
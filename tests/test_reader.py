@@ -0,0 +1,60 @@
+import bz2
+import gzip
+import io
+import lzma
+
+import pytest
+
+from conftest import MAPPING
+from pyretrace import Retrace
+from pyretrace.reader import MappingReader, MappingRecorder
+
+
+LINE = '\tat a.c.b(SourceFile:125)'
+DEOBFUSCATED_LINE = 'at com.example.FooActivity.onPause(SourceFile:125)'
+
+SOURCES = {
+    'bytes': lambda: MAPPING.encode('utf-8'),
+    'mmap-like': lambda: memoryview(MAPPING.encode('utf-8')),
+    'binary file object': lambda: io.BytesIO(MAPPING.encode('utf-8')),
+    'text file object': lambda: io.StringIO(MAPPING),
+    'gzip': lambda: gzip.compress(MAPPING.encode('utf-8')),
+    'bzip2': lambda: bz2.compress(MAPPING.encode('utf-8')),
+    'xz': lambda: lzma.compress(MAPPING.encode('utf-8')),
+}
+
+OPTIONS = {
+    'plain': {},
+    'parallel': {'load_jobs': 2},
+    'cache': {'use_cache': True},
+}
+
+
+def records(mapping_file):
+    recorder = MappingRecorder()
+    MappingReader(mapping_file).pump(recorder)
+    return recorder.records
+
+
+@pytest.mark.parametrize('source', sorted(SOURCES))
+def test_sources_read_like_path(mapping_file, source):
+    assert records(SOURCES[source]()) == records(mapping_file)
+
+
+@pytest.mark.parametrize('source', sorted(SOURCES))
+@pytest.mark.parametrize('options', sorted(OPTIONS))
+def test_sources_with_loading_options(tmp_path, source, options):
+    retrace = Retrace(SOURCES[source](), cache_dir=str(tmp_path) if options == 'cache' else None,
+                      **OPTIONS[options])
+    assert retrace.deobfuscate(LINE, False) == DEOBFUSCATED_LINE
+
+
+def test_lazy_needs_a_path():
+    with pytest.raises(ValueError):
+        Retrace(MAPPING.encode('utf-8'), lazy=True)
+
+
+@pytest.mark.parametrize('options', [{}, {'load_jobs': 2}, {'use_cache': True}, {'lazy': True}])
+def test_missing_mapping_file(tmp_path, options):
+    with pytest.raises(FileNotFoundError):
+        Retrace(str(tmp_path / 'missing.txt'), **options)
@@ -0,0 +1,58 @@
+import pytest
+
+from pyretrace import Retrace
+from pyretrace.cache import CACHE_SUFFIX, HEADER_SIZE
+from pyretrace.shared import SharedClassMap, SharedMappingTables
+
+
+@pytest.fixture(params=['eager', 'lazy', 'cached', 'shared'])
+def retrace(request, mapping_file):
+    if request.param == 'cached':
+        Retrace(mapping_file, use_cache=True)
+        return Retrace(mapping_file, use_cache=True)
+
+    if request.param == 'shared':
+        # The plain views over the tables of the compiled copy.
+        Retrace(mapping_file, use_cache=True)
+        retrace = Retrace(mapping_file, shared_tables=SharedMappingTables.open(mapping_file + CACHE_SUFFIX,
+                                                                               HEADER_SIZE))
+        assert isinstance(retrace.class_map, SharedClassMap)
+        return retrace
+
+    return Retrace(mapping_file, lazy=(request.param == 'lazy'))
+
+
+def test_lookup(retrace):
+    index = retrace.reverse_index()
+
+    assert index.lookup('com.example.Foo') == [('a.a', None)]
+    assert index.lookup('com.example.Foo.run') == [('a.a', 'a')]
+    assert index.lookup('com.example.Foo.name') == [('a.a', 'b')]
+    assert index.lookup('com.example.Bar.foo') == [('a.b', 'a')]
+    assert index.lookup('com.example.FooActivity.onResume') == [('a.c', 'a')]
+    assert index.lookup('com.example.Foo.missing') == []
+    assert index.lookup('com.example.Missing.run') == []
+    assert index.obfuscated_method_names('com.example.Foo', 'compute') == ['b']
+
+
+def test_classes_with_prefix(retrace):
+    index = retrace.reverse_index()
+
+    assert index.classes_with_prefix('com.example.Foo') == [('com.example.Foo', 'a.a'),
+                                                             ('com.example.FooActivity', 'a.c')]
+    assert index.classes_with_prefix('com.example.') == [('com.example.Bar', 'a.b'),
+                                                          ('com.example.Foo', 'a.a'),
+                                                          ('com.example.FooActivity', 'a.c')]
+    assert index.classes_with_prefix('org.') == []
+
+
+def test_members_indexed_on_first_lookup(mapping_file):
+    retrace = Retrace(mapping_file, lazy=True)
+    index = retrace.reverse_index()
+    assert not index.members
+    assert 'com.example.Bar' not in retrace.class_method_map
+
+    assert index.lookup('com.example.Foo.run') == [('a.a', 'a')]
+    assert list(index.members) == ['com.example.Foo']
+    assert 'com.example.Bar' not in retrace.class_method_map
+    assert retrace.reverse_index() is index
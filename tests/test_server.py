@@ -0,0 +1,79 @@
+import asyncio
+import json
+import time
+
+from conftest import DEOBFUSCATED_TRACE, TRACE
+from pyretrace.server import MAX_REQUEST_SIZE, RetraceServer
+from pyretrace.store import MappingStore
+
+
+async def serve_one_connection(server, client):
+    """
+    Serves a single connection with the given server, running the client
+    against it. Returns the client's result once the connection is handled.
+    """
+
+    server.semaphore = asyncio.Semaphore(server.max_concurrency)
+    handled = asyncio.Event()
+
+    async def handle_connection(reader, writer):
+        try:
+            await server.handle_connection(reader, writer)
+        finally:
+            handled.set()
+
+    listener = await asyncio.start_server(handle_connection, '127.0.0.1', 0, limit=MAX_REQUEST_SIZE)
+    async with listener:
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+        result = await client(reader, writer)
+        await asyncio.wait_for(handled.wait(), 10)
+
+    return result
+
+
+def request(request_id, build_id='build', trace=TRACE):
+    return json.dumps({'id': request_id, 'build': build_id, 'trace': trace}).encode('utf-8') + b'\n'
+
+
+def test_server_answers_requests_in_order(mapping_file):
+    server = RetraceServer(MappingStore({'build': mapping_file}.__getitem__))
+
+    async def client(reader, writer):
+        writer.write(request(1) + b'\n' + request(2, 'missing') + request(3))
+        writer.write_eof()
+
+        responses = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            responses.append(json.loads(line))
+
+        writer.close()
+        return responses
+
+    responses = asyncio.run(serve_one_connection(server, client))
+
+    assert [response['id'] for response in responses] == [1, 2, 3]
+    assert responses[0]['trace'] == DEOBFUSCATED_TRACE.rstrip('\n')
+    assert 'error' in responses[1]
+    assert responses[2]['trace'] == DEOBFUSCATED_TRACE.rstrip('\n')
+
+
+def test_server_handles_reset_connection_with_queued_requests(mapping_file):
+    server = RetraceServer(MappingStore(lambda build_id: mapping_file), max_concurrency=1)
+
+    # Slow enough for requests to pile up in the queue.
+    deobfuscate = server.deobfuscate
+    server.deobfuscate = lambda build_id, trace: time.sleep(0.01) or deobfuscate(build_id, trace)
+
+    async def client(reader, writer):
+        writer.write(b''.join(request(request_id, trace=TRACE * 100) for request_id in range(40)))
+        await reader.readline()
+
+        # Unread responses make the connection reset.
+        writer.transport.abort()
+
+    asyncio.run(serve_one_connection(server, client))
@@ -0,0 +1,65 @@
+import pickle
+
+import pytest
+
+from benchmarks.synthetic import generate_mapping, generate_trace_lines
+from pyretrace import MethodInfo, MethodSet, Retrace
+from pyretrace.shared import SharedMappingTables, compile_tables
+
+
+def method_tuples(method_infos):
+    return [(method_info.first_line_number, method_info.last_line_number, method_info.type,
+             method_info.arguments, method_info.original_name) for method_info in method_infos]
+
+
+@pytest.fixture
+def synthetic_mapping_file(tmp_path):
+    return generate_mapping(str(tmp_path / 'mapping.txt'), classes=200, unranged=0.2)
+
+
+def test_shared_tables_match_retrace(synthetic_mapping_file, tmp_path):
+    retrace = Retrace(synthetic_mapping_file)
+    tables = SharedMappingTables.create(retrace, str(tmp_path / 'tables'))
+    shared_retrace = Retrace(None, shared_tables=tables)
+
+    lines = [line.rstrip('\n') for line in generate_trace_lines(2000, classes=200)]
+    assert shared_retrace.deobfuscate_many(lines) == retrace.deobfuscate_many(lines)
+
+
+def test_shared_tables_match_retrace_verbosely(mapping_file, tmp_path):
+    from conftest import TRACE
+
+    retrace = Retrace(mapping_file, verbose=True)
+    tables = SharedMappingTables.create(retrace, str(tmp_path / 'tables'))
+    shared_retrace = Retrace(None, verbose=True, shared_tables=tables)
+
+    assert shared_retrace.deobfuscate_many(TRACE.splitlines()) == retrace.deobfuscate_many(TRACE.splitlines())
+
+
+def test_shared_tables_survive_pickling(mapping_file, tmp_path):
+    retrace = Retrace(mapping_file)
+    tables = pickle.loads(pickle.dumps(SharedMappingTables.create(retrace, str(tmp_path / 'tables'))))
+
+    assert dict(tables.class_map.items()) == retrace.class_map
+    for class_name, method_map in retrace.class_method_map.items():
+        shared_method_map = tables.class_method_map.get(class_name)
+        assert sorted(shared_method_map) == sorted(method_map)
+        for obfuscated_name, method_set in method_map.items():
+            assert method_tuples(shared_method_map.get(obfuscated_name)) == method_tuples(method_set)
+
+
+def test_shared_method_candidates_match_method_set():
+    method_set = MethodSet()
+    method_set.add(MethodInfo(0, 0, 'void', '', 'unranged'))
+    for index in range(50):
+        method_set.add(MethodInfo(index * 10 + 1, index * 10 + 9, 'void', 'int', 'method%d' % index))
+    method_set.add(MethodInfo(5, 25, 'void', '', 'inlined'))
+    method_set.add(MethodInfo(0xFFFFFFF0, 0xFFFFFFFF, 'void', '', 'last'))
+
+    class_method_map = {'com.example.Big': {'a': method_set, 'b': MethodSet()}}
+    tables = SharedMappingTables(compile_tables({'a': 'com.example.Big'}, {}, class_method_map))
+    shared_method_set = tables.class_method_map.get('com.example.Big').get('a')
+
+    for line_number in list(range(0, 520)) + [0xFFFFFFF0, 0xFFFFFFFF]:
+        assert method_tuples(shared_method_set.candidates(line_number)) == \
+            method_tuples(method_set.candidates(line_number))
@@ -0,0 +1,34 @@
+from conftest import TRACE
+from pyretrace import Retrace
+
+
+def test_stats_count_lines(mapping_file):
+    lines = TRACE.splitlines()
+    retrace = Retrace(mapping_file, stats=True)
+    retrace.deobfuscate_many(lines)
+
+    stats = retrace.stats()
+    assert stats['lines'] == len(lines)
+    assert stats['matched'] + stats['unmatched'] == len(lines)
+    assert stats['skipped'] == 0
+
+
+def test_stats_count_cached_lines(mapping_file):
+    lines = TRACE.splitlines() * 3
+    retrace = Retrace(mapping_file, cache_size=100, stats=True)
+    assert retrace.deobfuscate_many(lines) == Retrace(mapping_file).deobfuscate_many(lines)
+
+    stats = retrace.stats()
+    assert stats['lines'] == len(lines)
+    assert stats['matched'] + stats['unmatched'] == len(lines) // 3
+    assert stats['skipped'] == retrace.cache_info()['hits'] == len(lines) * 2 // 3
+
+
+def test_stats_count_prefiltered_lines(mapping_file):
+    lines = TRACE.splitlines()
+    retrace = Retrace(mapping_file, prefilter=True, stats=True)
+    assert retrace.deobfuscate_many(lines) == Retrace(mapping_file).deobfuscate_many(lines)
+
+    stats = retrace.stats()
+    assert stats['skipped'] == retrace.prefilter_info()['skipped'] > 0
+    assert stats['matched'] + stats['unmatched'] + stats['skipped'] == len(lines)
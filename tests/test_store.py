@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from pyretrace.store import MappingStore
+
+THREADS = 8
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def get_concurrently(store, build_id, release):
+    results = [None] * THREADS
+
+    def get(index):
+        try:
+            results[index] = store.get(build_id)
+        except Exception as ex:
+            results[index] = ex
+
+    threads = [threading.Thread(target=get, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+
+    # Let the load finish only once every other thread waits for it.
+    wait_for(lambda: store.coalesced == THREADS - 1)
+    release.set()
+
+    for thread in threads:
+        thread.join(10)
+
+    return results
+
+
+def test_concurrent_gets_load_once(mapping_file):
+    release = threading.Event()
+
+    def resolve(build_id):
+        release.wait(10)
+        return mapping_file
+
+    store = MappingStore(resolve)
+    results = get_concurrently(store, 'build', release)
+
+    assert store.loads == 1
+    assert store.coalesced == THREADS - 1
+    assert all(retrace is results[0] for retrace in results)
+    assert store.get('build') is results[0]
+
+
+def test_failed_load_raises_in_every_waiter():
+    release = threading.Event()
+    error = IOError('no mapping')
+
+    def resolve(build_id):
+        release.wait(10)
+        raise error
+
+    store = MappingStore(resolve)
+    results = get_concurrently(store, 'build', release)
+
+    assert all(result is error for result in results)
+    assert store.loads == 0
+    assert not store.pending
+
+    # Nothing failed is kept: the next get loads again.
+    release.clear()
+    with pytest.raises(IOError):
+        threading.Timer(0.01, release.set).start()
+        store.get('build')
+
+
+def test_eviction_by_max_bytes(mapping_file):
+    store = MappingStore(lambda build_id: mapping_file, max_bytes=25, sizeof=lambda retrace: 10)
+
+    first = store.get('first')
+    store.get('second')
+    assert store.get('first') is first
+
+    # The least recently used build goes once they no longer fit.
+    store.get('third')
+    stats = store.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] == 20
+    assert store.get('first') is first
+    assert store.loads == 3
+
+    store.get('second')
+    assert store.loads == 4
@@ -0,0 +1,66 @@
+import pytest
+
+from benchmarks.synthetic import generate_logcat_lines, generate_mapping
+from conftest import DEOBFUSCATED_TRACE, TRACE
+from pyretrace import Retrace
+from pyretrace.traces import TraceDeduplicator, split_traces
+
+
+LOGCAT_PREFIXES = ['10-17 12:00:01.123  1234  5678 E AndroidRuntime: ',
+                   '10-17 12:00:01.123 E/AndroidRuntime( 1234): ',
+                   'E/AndroidRuntime( 1234): ']
+
+
+@pytest.fixture
+def synthetic_mapping_file(tmp_path):
+    return generate_mapping(str(tmp_path / 'mapping.txt'), classes=200)
+
+
+@pytest.mark.parametrize('prefix', [''] + LOGCAT_PREFIXES)
+def test_split_traces(prefix):
+    lines = [prefix + line for line in TRACE.splitlines()]
+    assert list(split_traces(lines)) == [lines[:8], lines[8:]]
+    assert list(split_traces([line.encode() for line in lines]))[0] == [line.encode() for line in lines[:8]]
+
+
+def test_logcat_traces_are_deduplicated(mapping_file):
+    retrace = Retrace(mapping_file)
+    lines = []
+    for second, pid in ((1, 1234), (2, 1234), (3, 987)):
+        for prefix in LOGCAT_PREFIXES:
+            prefix = prefix.replace('01.123', '%02d.456' % second).replace('1234', str(pid))
+            lines.extend(prefix + line for line in TRACE.splitlines()[:8])
+
+    deduplicator = TraceDeduplicator(retrace)
+    assert list(deduplicator.expand(lines)) == retrace.deobfuscate_many(lines)
+    assert deduplicator.stats()['deobfuscated'] == len(LOGCAT_PREFIXES)
+
+
+@pytest.mark.parametrize('prefixes', [['', LOGCAT_PREFIXES[2]], [LOGCAT_PREFIXES[2], ''],
+                                      [LOGCAT_PREFIXES[0], LOGCAT_PREFIXES[2]]])
+def test_copies_with_other_prefixes_are_deobfuscated_apart(mapping_file, prefixes):
+    retrace = Retrace(mapping_file)
+    lines = [prefix + line for prefix in prefixes for line in TRACE.splitlines()[:8]]
+
+    deduplicator = TraceDeduplicator(retrace)
+    assert list(deduplicator.expand(lines)) == retrace.deobfuscate_many(lines)
+    assert deduplicator.stats()['deobfuscated'] == 2
+
+
+def test_expand_matches_deobfuscation(synthetic_mapping_file):
+    retrace = Retrace(synthetic_mapping_file)
+    lines = [line.rstrip('\n') for line in generate_logcat_lines(5000, classes=200)]
+
+    assert list(TraceDeduplicator(retrace, 10).expand(lines)) == retrace.deobfuscate_many(lines)
+
+
+def test_expand_is_bounded(mapping_file, tmp_path):
+    trace_file = tmp_path / 'trace.txt'
+    trace_file.write_text(TRACE * 3)
+
+    output_file = tmp_path / 'output.txt'
+    with open(str(output_file), 'w') as output:
+        Retrace(mapping_file, stacktrace_file=str(trace_file)).execute(output=output, dedupe='expand',
+                                                                       dedupe_traces=1)
+
+    assert output_file.read_text() == DEOBFUSCATED_TRACE * 3